@@ -0,0 +1,334 @@
+"""
+Headless command line interface.
+
+Used with `run.py --no-gui ...`. Only the crypto core is imported here, never
+Qt or keyring, so it starts quickly and works on servers without a display.
+Results are printed as a single JSON object on stdout.
+
+A path of `-` locks or unlocks stdin to stdout, e.g.
+`pg_dump db | run.py lock - > db.elock`. The JSON result then goes to stderr.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+# Environment variables read when no other password source is given
+PASSWORD_ENV = "EASYLOCK_PASSWORD"
+NEW_PASSWORD_ENV = "EASYLOCK_NEW_PASSWORD"
+
+# Exit codes
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+EXIT_BAD_PASSWORD = 3
+EXIT_NOT_FOUND = 4
+EXIT_CORRUPTED = 5
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="easylock --no-gui",
+        description="Lock, unlock, rekey or list files without the graphical interface.",
+    )
+    parser.add_argument("command", choices=["lock", "unlock", "rekey", "list"])
+    parser.add_argument("paths", nargs="+", help="files or directories to process, or - for stdin/stdout")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--password-env", metavar="VAR", default=PASSWORD_ENV,
+                        help=f"read the password from this environment variable (default: {PASSWORD_ENV})")
+    source.add_argument("--password-fd", metavar="FD", type=int,
+                        help="read the password from an open file descriptor")
+    source.add_argument("--password-stdin", action="store_true",
+                        help="read the password from the first line of stdin")
+    source.add_argument("--keyfile", metavar="PATH",
+                        help="use the bytes of this file (at least 32, random) as a raw key "
+                             "instead of a password; skips the password KDF")
+    new_source = parser.add_mutually_exclusive_group()
+    new_source.add_argument("--new-password-env", metavar="VAR", default=NEW_PASSWORD_ENV,
+                            help=f"rekey: read the new password from this environment variable (default: {NEW_PASSWORD_ENV})")
+    new_source.add_argument("--new-password-fd", metavar="FD", type=int,
+                            help="rekey: read the new password from an open file descriptor")
+    new_source.add_argument("--new-keyfile", metavar="PATH",
+                            help="rekey: use this keyfile as the new key")
+    parser.add_argument("--keep", action="store_true", help="keep the source files")
+    parser.add_argument("--archive", action="store_true",
+                        help="lock: pack each folder into a single .elock archive")
+    parser.add_argument("--compress", choices=["none", "zlib", "zstd"], default=None,
+                        help="lock: compress compressible files before encryption")
+    parser.add_argument("--compress-level", type=int, default=None,
+                        help="lock: compression level (default depends on the algorithm)")
+    parser.add_argument("--cipher", choices=["auto", "aes-gcm", "chacha20-poly1305"], default=None,
+                        help="lock: payload cipher (default: from config, benchmarked once)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="lock: only process files that are new or changed since the last run")
+    parser.add_argument("--manifest", metavar="FILE", default=None,
+                        help="lock: state file of --incremental runs (default: in the config directory)")
+    parser.add_argument("--io", choices=["buffered", "nocache", "direct"], default=None,
+                        help="file I/O: nocache drops processed data from the page cache, "
+                             "direct bypasses it with O_DIRECT (default: buffered)")
+    parser.add_argument("--background", action="store_true", default=None,
+                        help="run at idle CPU and I/O priority (nice 19, ionice idle)")
+    parser.add_argument("--limit-mbps", metavar="MB", type=float, default=None,
+                        help="cap the combined throughput in MB/s (0 for no cap)")
+    parser.add_argument("--max-files", metavar="N", type=int, default=None,
+                        help="cap the number of files processed at once (0 for no cap)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="threads (single file) or processes (batch) to use")
+    return parser
+
+def _cipher(args) -> str:
+    """Cipher for new files: --cipher if given, otherwise the configured/benchmarked one."""
+    if args.cipher and args.cipher != "auto":
+        return args.cipher
+    from app.utils.config import get_cipher
+    return get_cipher()
+
+def _kdf_params(password):
+    """KDF for new files: the configured one for passwords, none needed for raw keys."""
+    if isinstance(password, bytes):
+        return None
+    from app.utils.config import get_kdf_params
+    return get_kdf_params()
+
+def _read_fd(fd: int) -> str:
+    chunks = []
+    while True:
+        chunk = os.read(fd, 4096)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    os.close(fd)
+    return b"".join(chunks).decode("utf-8").rstrip("\r\n")
+
+def read_password(args):
+    """
+    Fetch the password from the selected source, without a trailing newline,
+    or the raw key (bytes) of --keyfile.
+    """
+    if args.keyfile:
+        from app.core.kdf import load_keyfile
+        return load_keyfile(args.keyfile)
+    if args.password_fd is not None:
+        return _read_fd(args.password_fd)
+    if args.password_stdin:
+        return sys.stdin.readline().rstrip("\r\n")
+    return os.environ.get(args.password_env, "")
+
+def read_new_password(args):
+    """Fetch the new password (or raw key) used by rekey."""
+    if args.new_keyfile:
+        from app.core.kdf import load_keyfile
+        return load_keyfile(args.new_keyfile)
+    if args.new_password_fd is not None:
+        return _read_fd(args.new_password_fd)
+    return os.environ.get(args.new_password_env, "")
+
+def _emit(payload: dict, stream=None):
+    stream = stream or sys.stdout
+    json.dump(payload, stream)
+    stream.write("\n")
+    stream.flush()
+
+def _exit_code(error: Exception) -> int:
+    from app.core.crypto import CorruptedFileError
+
+    if isinstance(error, FileNotFoundError):
+        return EXIT_NOT_FOUND
+    if isinstance(error, CorruptedFileError):
+        return EXIT_CORRUPTED
+    if "Invalid password" in str(error):
+        return EXIT_BAD_PASSWORD
+    return EXIT_FAILED
+
+def _report(command: str, result) -> int:
+    """Print a BatchResult as JSON and map it to an exit code."""
+    _emit({
+        "ok": not result.failed,
+        "command": command,
+        "succeeded": [{"path": path} for path in result.succeeded],
+        "failed": [{"path": path, "error": error} for path, error in result.failed],
+        "processed": result.total,
+        "skipped": result.skipped,
+        "unchanged": result.unchanged,
+        "elapsed": result.elapsed,
+    })
+    if not result.failed:
+        return EXIT_OK
+    if all("Invalid password" in error for _, error in result.failed):
+        return EXIT_BAD_PASSWORD
+    return EXIT_FAILED
+
+def _list_archives(paths, password) -> int:
+    """Print the contents of folder archives, decrypting only their index."""
+    from app.core.archive import list_archive
+
+    archives = []
+    for path in paths:
+        try:
+            entries = list_archive(path, password)
+        except Exception as e:
+            _emit({"ok": False, "command": "list", "failed": [{"path": path, "error": str(e)}]})
+            return _exit_code(e)
+        archives.append({"path": path, "entries": entries})
+    _emit({"ok": True, "command": "list", "archives": archives})
+    return EXIT_OK
+
+def _lock_archives(args, password) -> int:
+    """Lock each folder into one .elock archive, sharing a single key derivation."""
+    from app.core.archive import encrypt_directory
+    from app.core.crypto import KeySession
+
+    start = time.perf_counter()
+    session = KeySession(password, _kdf_params(password))
+    cipher = _cipher(args)
+    succeeded, failed, code = [], [], EXIT_OK
+    for path in args.paths:
+        try:
+            output = encrypt_directory(path, password, keep_original=args.keep, workers=args.workers,
+                                       session=session, compress=args.compress,
+                                       compress_level=args.compress_level, cipher=cipher)
+        except Exception as e:
+            failure = {"path": path, "error": str(e)}
+            if getattr(e, "output_path", None):
+                # Archived, but files that changed meanwhile were kept
+                failure["output"] = e.output_path
+            failed.append(failure)
+            code = code or _exit_code(e)
+            continue
+        succeeded.append({"path": path, "output": output})
+    _emit({"ok": not failed, "command": "lock", "succeeded": succeeded, "failed": failed,
+           "elapsed": time.perf_counter() - start})
+    return code
+
+def _run_pipe(args, password) -> int:
+    """Lock or unlock stdin to stdout; the report goes to stderr to keep stdout clean."""
+    from app.core.crypto import KeySession, encrypt_stream, decrypt_stream
+
+    start = time.perf_counter()
+    try:
+        if args.command == "lock":
+            encrypt_stream(sys.stdin.buffer, sys.stdout.buffer, password, workers=args.workers,
+                           session=KeySession(password, _kdf_params(password)),
+                           compress=args.compress, compress_level=args.compress_level,
+                           cipher=_cipher(args))
+        else:
+            decrypt_stream(sys.stdin.buffer, sys.stdout.buffer, password, workers=args.workers)
+    except Exception as e:
+        _emit({"ok": False, "command": args.command, "failed": [{"path": "-", "error": str(e)}],
+               "elapsed": time.perf_counter() - start}, sys.stderr)
+        return _exit_code(e)
+    _emit({"ok": True, "command": args.command, "succeeded": [{"path": "-", "output": "-"}],
+           "failed": [], "elapsed": time.perf_counter() - start}, sys.stderr)
+    return EXIT_OK
+
+def run_cli(argv) -> int:
+    """Run the headless CLI with argv (without the program name) and return the exit code."""
+    args = build_parser().parse_args([a for a in argv if a != "--no-gui"])
+    pipe = "-" in args.paths
+    report = sys.stderr if pipe else sys.stdout
+
+    if pipe and (args.paths != ["-"] or args.command not in ("lock", "unlock")
+                 or args.password_stdin or args.archive):
+        _emit({"ok": False, "error": "'-' must be the only path of lock or unlock, "
+                                     "without --password-stdin or --archive."}, report)
+        return EXIT_USAGE
+
+    if args.command == "lock" and args.compress:
+        from app.core.crypto import CryptoError, check_compression
+        try:
+            check_compression(args.compress, args.compress_level)
+        except CryptoError as e:
+            _emit({"ok": False, "error": str(e)}, report)
+            return EXIT_USAGE
+
+    try:
+        password = read_password(args)
+    except (OSError, ValueError) as e:
+        _emit({"ok": False, "error": f"Cannot use keyfile: {e}"}, report)
+        return EXIT_USAGE
+    if not password:
+        _emit({"ok": False, "error": "No password provided."}, report)
+        return EXIT_USAGE
+
+    if pipe:
+        return _run_pipe(args, password)
+
+    if (args.incremental or args.manifest) and (args.command != "lock" or args.archive):
+        _emit({"ok": False, "error": "--incremental and --manifest only apply to lock without --archive."})
+        return EXIT_USAGE
+
+    if args.command == "rekey":
+        try:
+            new_password = read_new_password(args)
+        except (OSError, ValueError) as e:
+            _emit({"ok": False, "error": f"Cannot use keyfile: {e}"})
+            return EXIT_USAGE
+        if not new_password:
+            _emit({"ok": False, "error": "No new password provided."})
+            return EXIT_USAGE
+        from app.core.batch import run_rekey
+        return _report(args.command, run_rekey(args.paths, password, new_password,
+                                               _kdf_params(new_password)))
+
+    if args.command == "list":
+        return _list_archives(args.paths, password)
+
+    if args.archive and args.command == "lock":
+        return _lock_archives(args, password)
+
+    kdf_params = cipher = None
+    if args.command == "lock":
+        kdf_params = _kdf_params(password)
+        cipher = _cipher(args)
+
+    # Batches follow the tray's Background Jobs settings, and changes made there
+    # apply while they run; a single file is only limited on request
+    from app.utils.config import new_scheduler
+    limits = {"background": args.background, "mb_per_s": args.limit_mbps,
+              "max_files": args.max_files}
+    single = len(args.paths) == 1 and not os.path.isdir(args.paths[0]) and not args.incremental
+    scheduler = None
+    if not single or any(value is not None for value in limits.values()):
+        scheduler = new_scheduler(**limits)
+
+    start = time.perf_counter()
+    if single:
+        from contextlib import nullcontext
+        from app.core.crypto import KeySession, encrypt_file, decrypt_file
+
+        path = args.paths[0]
+        throttle = scheduler.throttle if scheduler else None
+        try:
+            with scheduler.job() if scheduler else nullcontext():
+                if args.command == "lock":
+                    output = encrypt_file(path, password, keep_original=args.keep, workers=args.workers,
+                                          session=KeySession(password, kdf_params), cipher=cipher,
+                                          compress=args.compress, compress_level=args.compress_level,
+                                          io_mode=args.io, throttle=throttle)
+                else:
+                    output = decrypt_file(path, password, keep_original=args.keep, workers=args.workers,
+                                          io_mode=args.io, throttle=throttle)
+        except Exception as e:
+            _emit({"ok": False, "command": args.command, "failed": [{"path": path, "error": str(e)}],
+                   "elapsed": time.perf_counter() - start})
+            return _exit_code(e)
+        _emit({"ok": True, "command": args.command, "succeeded": [{"path": path, "output": output}],
+               "failed": [], "elapsed": time.perf_counter() - start})
+        return EXIT_OK
+
+    from app.core.batch import run_batch
+
+    manifest = None
+    if args.incremental:
+        from app.core.manifest import Manifest
+        from app.utils.config import MANIFEST_FILE
+        manifest = Manifest(args.manifest or MANIFEST_FILE)
+    try:
+        result = run_batch(args.command, args.paths, password, processes=args.workers,
+                           keep_original=args.keep, compress=args.compress,
+                           compress_level=args.compress_level, kdf_params=kdf_params, cipher=cipher,
+                           manifest=manifest, io_mode=args.io, scheduler=scheduler)
+    finally:
+        if manifest is not None:
+            manifest.close()
+    return _report(args.command, result)
@@ -0,0 +1,368 @@
+import os
+import json
+import stat
+import shutil
+import struct
+import itertools
+from app.core import fileio
+from app.core.crypto import (Header, KeySession, CryptoError, CorruptedFileError, MAGIC,
+                             EXTENSION, DEFAULT_CHUNK_SIZE, CONTENT_ARCHIVE, apply_compression,
+                             apply_cipher, read_header, monitored, seal_chunks, open_chunks)
+from app.core.reader import open_elock
+
+# Archive payload: [INDEX LEN (8)][INDEX (JSON)][FILE DATA in index order]
+INDEX_VERSION = 1
+INDEX_LENGTH = struct.Struct(">Q")
+MAX_INDEX_SIZE = 256 * 1024 * 1024
+
+class SourceChangedError(CryptoError):
+    """
+    Raised when files changed between the scan and the removal of the folder.
+
+    The archive was written and holds their scanned state; the changed files
+    were kept in place, so no data is lost.
+    """
+
+    def __init__(self, output_path: str, changed):
+        self.output_path = output_path
+        self.changed = list(changed)
+        names = ", ".join(self.changed[:5]) + (" ..." if len(self.changed) > 5 else "")
+        super().__init__(f"{len(self.changed)} file(s) changed while archiving and were kept, "
+                         f"not archived in their current state: {names}")
+
+def _scan(root: str):
+    """List directories and regular files below root, parents before children. Symlinks are skipped."""
+    entries = []
+    stack = [""]
+    while stack:
+        rel = stack.pop()
+        with os.scandir(os.path.join(root, rel)) as it:
+            for entry in sorted(it, key=lambda e: e.name):
+                rel_path = f"{rel}/{entry.name}" if rel else entry.name
+                st = entry.stat(follow_symlinks=False)
+                info = {"path": rel_path, "mode": stat.S_IMODE(st.st_mode), "mtime": st.st_mtime}
+                if entry.is_dir(follow_symlinks=False):
+                    info["type"] = "dir"
+                    stack.append(rel_path)
+                elif entry.is_file(follow_symlinks=False):
+                    info["type"] = "file"
+                    info["size"] = st.st_size
+                else:
+                    continue
+                entries.append(info)
+    return entries
+
+def _safe_path(root: str, rel: str) -> str:
+    """Resolve an index path below root, rejecting absolute or escaping paths."""
+    parts = rel.split("/") if isinstance(rel, str) else [""]
+    if any(part in ("", ".", "..") or "\\" in part for part in parts) or ":" in parts[0]:
+        raise CorruptedFileError("Archive contains an unsafe path.")
+    return os.path.join(root, *parts)
+
+def _parse_index(data: bytes):
+    try:
+        index = json.loads(data.decode("utf-8"))
+        entries = index["entries"]
+        for entry in entries:
+            if entry["type"] == "file" and (not isinstance(entry["size"], int) or entry["size"] < 0):
+                raise ValueError
+            if entry["type"] not in ("file", "dir"):
+                raise ValueError
+    except (ValueError, KeyError, TypeError):
+        raise CorruptedFileError("Archive index is corrupted or invalid.")
+    return entries
+
+class _ArchiveSource:
+    """Read-only stream producing the archive payload of a folder."""
+
+    def __init__(self, root: str, entries):
+        index = json.dumps({"version": INDEX_VERSION, "entries": entries}).encode("utf-8")
+        self._root = root
+        self._buffer = INDEX_LENGTH.pack(len(index)) + index
+        self._files = iter([e for e in entries if e["type"] == "file"])
+        self._current = None
+        self._current_path = None
+        self._remaining = 0
+        self._pos = 0
+        self.total = len(self._buffer) + sum(e["size"] for e in entries if e["type"] == "file")
+
+    def tell(self) -> int:
+        return self._pos
+
+    def read(self, size: int) -> bytes:
+        out = bytearray()
+        while len(out) < size:
+            if self._buffer:
+                take = self._buffer[:size - len(out)]
+                self._buffer = self._buffer[len(take):]
+                out += take
+            elif self._current is not None:
+                data = self._current.read(min(size - len(out), self._remaining))
+                if not data:
+                    raise CryptoError(f"File changed while archiving: {self._current_path}")
+                out += data
+                self._remaining -= len(data)
+                if not self._remaining:
+                    self._close_current()
+            else:
+                entry = next(self._files, None)
+                if entry is None:
+                    break
+                # Sizes come from the scan; growing files are cut there, shrinking ones fail
+                self._current_path = _safe_path(self._root, entry["path"])
+                self._current = open(self._current_path, 'rb')
+                self._remaining = entry["size"]
+                if not self._remaining:
+                    self._close_current()
+        self._pos += len(out)
+        return bytes(out)
+
+    def _close_current(self):
+        self._current.close()
+        self._current = None
+
+    def close(self):
+        if self._current is not None:
+            self._close_current()
+
+class _ArchiveSink:
+    """Writable stream that unpacks an archive payload into a directory."""
+
+    def __init__(self, root: str, io_mode: str = None):
+        self._root = root
+        self._io_mode = io_mode
+        self._head = bytearray()
+        self._entries = None
+        self._files = None
+        self._current = None
+        self._current_entry = None
+        self._remaining = 0
+
+    def write(self, data):
+        view = memoryview(data)
+        while view:
+            if self._entries is None:
+                view = self._read_index(view)
+                continue
+            if self._current is None:
+                self._open_next()
+                if self._current is None:
+                    raise CorruptedFileError("Archive contains unexpected trailing data.")
+            n = min(len(view), self._remaining)
+            self._current.write(view[:n])
+            view = view[n:]
+            self._remaining -= n
+            if not self._remaining:
+                self._finish_current()
+
+    def _read_index(self, view):
+        need = INDEX_LENGTH.size
+        if len(self._head) >= need:
+            (index_size,) = INDEX_LENGTH.unpack_from(self._head)
+            if index_size > MAX_INDEX_SIZE:
+                raise CorruptedFileError("Archive index is corrupted or invalid.")
+            need += index_size
+        take = min(len(view), need - len(self._head))
+        self._head += view[:take]
+        if len(self._head) == need and need > INDEX_LENGTH.size:
+            self._entries = _parse_index(bytes(self._head[INDEX_LENGTH.size:]))
+            self._head = None
+            for entry in self._entries:
+                if entry["type"] == "dir":
+                    os.makedirs(_safe_path(self._root, entry["path"]), exist_ok=True)
+            self._files = iter([e for e in self._entries if e["type"] == "file"])
+        return view[take:]
+
+    def _open_next(self):
+        """Open the next file that expects data, creating empty files on the way."""
+        for entry in self._files:
+            path = _safe_path(self._root, entry["path"])
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._current = fileio.open_writer(path, self._io_mode, entry["size"])
+            self._current_entry = entry
+            self._remaining = entry["size"]
+            if self._remaining:
+                return
+            self._finish_current()
+
+    def _finish_current(self):
+        self._current.close()
+        self._current = None
+        _restore_metadata(_safe_path(self._root, self._current_entry["path"]), self._current_entry)
+
+    def finish(self):
+        """Check that every file was fully written and restore directory metadata."""
+        if self._entries is None:
+            raise CorruptedFileError("Archive index is corrupted or invalid.")
+        if self._current is None:
+            self._open_next()
+        if self._current is not None:
+            raise CorruptedFileError("Archive is truncated.")
+        # Deepest directories first, so restoring a child does not bump its parent's mtime
+        for entry in reversed(self._entries):
+            if entry["type"] == "dir":
+                _restore_metadata(_safe_path(self._root, entry["path"]), entry)
+
+    def close(self):
+        if self._current is not None:
+            self._current.close()
+            self._current = None
+
+def _restore_metadata(path: str, entry: dict):
+    try:
+        os.chmod(path, entry.get("mode", 0o644) & 0o777)
+        mtime = entry.get("mtime")
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+    except (OSError, TypeError, ValueError):
+        pass
+
+def _remove_archived(root: str, entries) -> list:
+    """
+    Delete what was archived, leaving anything that appeared in the meantime.
+
+    Files whose size or mtime no longer match the scan were written to
+    meanwhile and are kept; their relative paths are returned.
+    """
+    changed = []
+    for entry in entries:
+        if entry["type"] != "file":
+            continue
+        path = os.path.join(root, *entry["path"].split("/"))
+        try:
+            st = os.stat(path, follow_symlinks=False)
+        except FileNotFoundError:
+            # Deleted after the scan; the archive already holds it
+            continue
+        if st.st_size != entry["size"] or st.st_mtime != entry["mtime"]:
+            changed.append(entry["path"])
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    for entry in reversed(entries):
+        if entry["type"] == "dir":
+            try:
+                os.rmdir(os.path.join(root, *entry["path"].split("/")))
+            except OSError:
+                pass
+    try:
+        os.rmdir(root)
+    except OSError:
+        pass
+    return changed
+
+def encrypt_directory(dir_path: str, password: str, keep_original: bool = False,
+                      chunk_size: int = DEFAULT_CHUNK_SIZE, workers: int = None,
+                      session: KeySession = None, progress=None, cancel=None,
+                      compress: str = None, compress_level: int = None, cipher: str = None) -> str:
+    """
+    Pack a folder into a single .elock archive.
+
+    Paths, permissions and modification times are kept in an index at the
+    start of the payload, followed by the file contents. The payload is
+    sealed like any other v2 file, so one KDF and one header cover the whole
+    tree. Returns the path of the archive. Without keep_original, files that
+    changed while archiving are kept and reported with SourceChangedError.
+    """
+    if not os.path.isdir(dir_path):
+        raise FileNotFoundError(f"Source folder not found: {dir_path}")
+
+    root = os.path.abspath(dir_path)
+    entries = _scan(root)
+    source = _ArchiveSource(root, entries)
+    output_path = root + EXTENSION
+
+    try:
+        session = session or KeySession(password)
+        header = Header.new(session.lock_salt, chunk_size)
+        header.set_content(CONTENT_ARCHIVE)
+        apply_compression(header, compress, compress_level)
+        apply_cipher(header, cipher)
+        aead = header.aead(header.seal_data_key(session))
+
+        with open(output_path, 'wb') as dst:
+            dst.write(header.pack())
+            write = monitored(dst.write, source.tell, source.total, progress, cancel)
+            seal_chunks(source, dst, aead, header, workers, write)
+    except Exception as e:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        raise e
+    finally:
+        source.close()
+
+    if not keep_original:
+        changed = _remove_archived(root, entries)
+        if changed:
+            raise SourceChangedError(output_path, changed)
+
+    return output_path
+
+def _create_output_dir(base: str) -> str:
+    """Create the first free folder of base, base_decrypted, base_decrypted_2, ... and return it."""
+    suffixes = itertools.chain(["", "_decrypted"], (f"_decrypted_{n}" for n in itertools.count(2)))
+    for suffix in suffixes:
+        try:
+            os.mkdir(base + suffix)
+            return base + suffix
+        except FileExistsError:
+            continue
+
+def decrypt_archive(file_path: str, password: str, keep_original: bool = False,
+                    workers: int = None, session: KeySession = None,
+                    progress=None, cancel=None, io_mode: str = None, throttle=None) -> str:
+    """
+    Extract a .elock folder archive next to it and return the folder path.
+
+    io_mode and throttle apply to the archive and every extracted file, as in decrypt_file.
+    """
+    output_dir = None
+    sink = None
+    total_size = os.path.getsize(file_path)
+    try:
+        try:
+            io_mode = fileio.parse_io_mode(io_mode)
+        except ValueError as e:
+            raise CryptoError(str(e))
+        with fileio.open_reader(file_path, io_mode) as src:
+            src.read(len(MAGIC))
+            header = Header.read(src)
+            aead = header.aead(header.open_data_key(session or KeySession(password)))
+            output_dir = _create_output_dir(file_path[:-len(EXTENSION)])
+            sink = _ArchiveSink(output_dir, io_mode)
+            write = monitored(sink.write, src.tell, total_size - src.tell(), progress, cancel,
+                              throttle)
+            open_chunks(src, sink, aead, header, workers, write)
+            sink.finish()
+
+        if not keep_original:
+            os.remove(file_path)
+
+        return output_dir
+    except Exception as e:
+        # Never leave a partially extracted tree behind
+        if sink is not None:
+            sink.close()
+        if output_dir is not None:
+            shutil.rmtree(output_dir, ignore_errors=True)
+        raise e
+
+def list_archive(file_path: str, password: str, session: KeySession = None):
+    """Return the index entries of a .elock folder archive, decrypting only the index chunks."""
+    header = read_header(file_path)
+    if header is None or header.content != CONTENT_ARCHIVE:
+        raise CryptoError("File is not an EasyLock folder archive.")
+
+    with open_elock(file_path, password, session) as reader:
+        raw = reader.read(INDEX_LENGTH.size)
+        if len(raw) != INDEX_LENGTH.size:
+            raise CorruptedFileError("Archive index is corrupted or invalid.")
+        (index_size,) = INDEX_LENGTH.unpack(raw)
+        if index_size > MAX_INDEX_SIZE:
+            raise CorruptedFileError("Archive index is corrupted or invalid.")
+        data = reader.read(index_size)
+        if len(data) != index_size:
+            raise CorruptedFileError("Archive index is corrupted or invalid.")
+    return _parse_index(data)
@@ -0,0 +1,217 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from functools import partial
+from app.core.crypto import (encrypt_file, decrypt_file, rekey_file, check_compression, EXTENSION,
+                             KeySession)
+from app.core.scheduler import set_background, REFRESH_SECONDS
+from app.utils import trace
+
+# Default number of processes used for batch jobs
+DEFAULT_PROCESSES = os.cpu_count() or 1
+
+# Key session and Scheduler of the current worker process, see _init_worker
+_session = None
+_scheduler = None
+
+class BatchResult:
+    """Aggregated outcome of a batch lock/unlock run."""
+
+    def __init__(self):
+        self.succeeded = []
+        self.failed = []
+        self.skipped = 0
+        # Files left alone by an incremental run because they did not change
+        self.unchanged = 0
+        self.elapsed = 0.0
+
+    @property
+    def total(self) -> int:
+        return len(self.succeeded) + len(self.failed)
+
+    @property
+    def files_per_second(self) -> float:
+        return self.total / self.elapsed if self.elapsed else 0.0
+
+def _walk(path: str):
+    """Yield regular files below path using os.scandir, without following symlinks."""
+    stack = [path]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        yield entry.path
+        except OSError:
+            continue
+
+def collect_files(paths, command: str):
+    """
+    Expand files and directory trees into the list of files to process.
+
+    Returns (files, skipped): when locking, files that already carry the
+    .elock extension are skipped; when unlocking, only .elock files are kept.
+    """
+    files = []
+    skipped = 0
+    for path in paths:
+        candidates = _walk(path) if os.path.isdir(path) else [path]
+        for file_path in candidates:
+            if file_path.endswith(EXTENSION) == (command == "lock"):
+                skipped += 1
+            else:
+                files.append(file_path)
+    return files, skipped
+
+def _init_worker(session: KeySession, scheduler=None):
+    """Install the batch key session and scheduler in a freshly started worker process."""
+    global _session, _scheduler
+    _session = session
+    _scheduler = scheduler
+
+def _process_file(command: str, keep_original: bool, lock_options: dict, file_path: str):
+    """Lock or unlock a single file inside a worker process."""
+    throttle = None
+    if _scheduler is not None:
+        _scheduler.refresh()
+        set_background(_scheduler.background)
+        throttle = _scheduler.throttle
+    try:
+        # Parallelism comes from the process pool, keep each file single-threaded
+        if command == "lock":
+            encrypt_file(file_path, None, keep_original, workers=1, session=_session,
+                         throttle=throttle, **lock_options)
+        else:
+            decrypt_file(file_path, None, keep_original, workers=1, session=_session,
+                         io_mode=lock_options.get("io_mode"), throttle=throttle)
+        return file_path, None
+    except Exception as e:
+        return file_path, str(e)
+
+def _process_slice(job, file_paths):
+    return [job(file_path) for file_path in file_paths]
+
+def _scheduled(pool, job, files, processes: int, chunksize: int, scheduler):
+    """
+    Submit slices of files, keeping at most the scheduler's current max_files
+    slices in flight. Each slice runs its files one after another, so that is
+    also the number of files processed at once.
+    """
+    position = 0
+    running = set()
+    while True:
+        scheduler.refresh()
+        limit = min(processes, scheduler.max_files or processes)
+        while position < len(files) and len(running) < limit:
+            running.add(pool.submit(_process_slice, job, files[position:position + chunksize]))
+            position += chunksize
+        if not running:
+            return
+        done, running = wait(running, timeout=REFRESH_SECONDS, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield from future.result()
+
+def run_batch(command: str, paths, password: str, processes: int = None,
+              keep_original: bool = False, compress: str = None,
+              compress_level: int = None, kdf_params=None, cipher: str = None,
+              manifest=None, io_mode: str = None, scheduler=None) -> BatchResult:
+    """
+    Lock or unlock every file under the given paths on a process pool.
+
+    Failures are collected instead of raised so one bad file does not abort
+    the whole batch. The password goes through a single KeySession: locking
+    derives one KEK up front and hands it to every worker, unlocking caches
+    the KEK of each salt seen within a worker. New files use kdf_params.
+
+    With a Manifest (see app.core.manifest), locking is incremental: only
+    files that are new or changed since they were last locked are processed,
+    and every outcome is recorded as it arrives, so an interrupted run
+    resumes where it stopped. io_mode applies to both directions, see
+    app.core.fileio. A Scheduler (see app.core.scheduler) runs the workers
+    in the background class and caps throughput and files in flight; its
+    limits can change while the batch runs.
+    """
+    if manifest is not None and command != "lock":
+        raise ValueError("Incremental runs only apply to lock.")
+    if command == "lock":
+        # Fail before the KDF rather than in every worker
+        check_compression(compress, compress_level)
+
+    result = BatchResult()
+    start = time.perf_counter()
+
+    with trace.span("collect_files") as span:
+        if manifest is None:
+            files, result.skipped = collect_files(paths, command)
+        else:
+            from app.core.manifest import scan_changes
+            changed, result.skipped, result.unchanged = scan_changes(manifest, paths, keep_original)
+            files = list(changed)
+        span.set(files=len(files), skipped=result.skipped, unchanged=result.unchanged)
+    processes = min(processes or DEFAULT_PROCESSES, max(len(files), 1))
+    lock_options = {"compress": compress, "compress_level": compress_level, "cipher": cipher,
+                    "io_mode": io_mode}
+    job = partial(_process_file, command, keep_original, lock_options)
+
+    session = KeySession(password, kdf_params)
+    if command == "lock" and files and session.kdf_params.stretched:
+        # Pay the KDF cost once here instead of once per worker
+        session.kek(session.lock_salt)
+
+    if processes <= 1:
+        _init_worker(session, scheduler)
+        outcomes = map(job, files)
+        pool = None
+    else:
+        # Hand out files in slices to keep inter-process overhead low for small files
+        chunksize = max(1, min(64, len(files) // (processes * 4)))
+        pool = ProcessPoolExecutor(max_workers=processes, initializer=_init_worker,
+                                   initargs=(session, scheduler))
+        if scheduler is None:
+            outcomes = pool.map(job, files, chunksize=chunksize)
+        else:
+            outcomes = _scheduled(pool, job, files, processes, chunksize, scheduler)
+
+    try:
+        for file_path, error in outcomes:
+            if manifest is not None and changed[file_path] is not None:
+                manifest.record(file_path, changed[file_path], error)
+            if error is None:
+                result.succeeded.append(file_path)
+            else:
+                result.failed.append((file_path, error))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        if manifest is not None:
+            manifest.commit()
+
+    result.elapsed = time.perf_counter() - start
+    return result
+
+def run_rekey(paths, old_password: str, new_password: str, kdf_params=None) -> BatchResult:
+    """
+    Change the password of every .elock file under the given paths.
+
+    Each file only gets its header rewritten, so this runs sequentially; both
+    passwords go through a KeySession and cost one KDF run each per salt.
+    The new key block uses kdf_params, so rekeying also upgrades the KDF cost.
+    """
+    result = BatchResult()
+    start = time.perf_counter()
+
+    files, result.skipped = collect_files(paths, "unlock")
+    old_session = KeySession(old_password)
+    new_session = KeySession(new_password, kdf_params)
+    for file_path in files:
+        try:
+            rekey_file(file_path, None, None, old_session, new_session)
+            result.succeeded.append(file_path)
+        except Exception as e:
+            result.failed.append((file_path, str(e)))
+
+    result.elapsed = time.perf_counter() - start
+    return result
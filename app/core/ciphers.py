@@ -0,0 +1,55 @@
+import os
+import time
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+
+# Payload cipher identifiers stored in the .elock header; both use a
+# 12-byte nonce and a 16-byte tag, so the chunk layout is the same
+AES_GCM = 0
+CHACHA20_POLY1305 = 1
+
+CIPHERS = {"aes-gcm": AES_GCM, "chacha20-poly1305": CHACHA20_POLY1305}
+NAMES = {v: k for k, v in CIPHERS.items()}
+
+# Micro-benchmark: buffer sealed per round and rounds per cipher
+BENCHMARK_SIZE = 1024 * 1024
+BENCHMARK_ROUNDS = 8
+
+def new_aead(cipher: int, key: bytes):
+    """Return the AEAD object of a cipher identifier for a 32-byte key."""
+    if cipher == AES_GCM:
+        return AESGCM(key)
+    if cipher == CHACHA20_POLY1305:
+        return ChaCha20Poly1305(key)
+    raise ValueError(f"Unsupported cipher: {cipher}")
+
+def parse_cipher(name: str) -> int:
+    """Map a configuration name ('aes-gcm', 'chacha20-poly1305') to its identifier."""
+    try:
+        return CIPHERS[(name or "aes-gcm").lower()]
+    except KeyError:
+        raise ValueError(f"Unknown cipher: {name}")
+
+def benchmark() -> dict:
+    """
+    Measure sealing throughput of every cipher on this machine, in MB/s.
+
+    AES-GCM is only fast with AES-NI/PCLMUL (or ARMv8 crypto extensions);
+    without them ChaCha20-Poly1305 is usually several times faster.
+    """
+    data = os.urandom(BENCHMARK_SIZE)
+    nonce = bytes(12)
+    results = {}
+    for name, cipher in CIPHERS.items():
+        aead = new_aead(cipher, os.urandom(32))
+        aead.encrypt(nonce, data, None)
+        best = float("inf")
+        for _ in range(BENCHMARK_ROUNDS):
+            start = time.perf_counter()
+            aead.encrypt(nonce, data, None)
+            best = min(best, time.perf_counter() - start)
+        results[name] = round(BENCHMARK_SIZE / (1024 * 1024) / max(best, 1e-9), 1)
+    return results
+
+def fastest(results: dict) -> str:
+    """Name of the fastest cipher in benchmark() results; ties keep AES-GCM."""
+    return max(CIPHERS, key=lambda name: (results.get(name, 0), name == "aes-gcm"))
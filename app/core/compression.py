@@ -0,0 +1,109 @@
+import os
+import zlib
+
+# Compression algorithm identifiers stored in the .elock header
+NONE = 0
+ZLIB = 1
+ZSTD = 2
+
+ALGORITHMS = {"none": NONE, "zlib": ZLIB, "zstd": ZSTD}
+DEFAULT_LEVELS = {ZLIB: 6, ZSTD: 3}
+# Accepted levels; zlib's -1 (Z_DEFAULT_COMPRESSION) is stored as 6
+LEVEL_RANGES = {ZLIB: (0, 9), ZSTD: (1, 22)}
+
+# Per-chunk marker telling whether the chunk body is compressed or stored as is
+STORED = b"\x00"
+COMPRESSED = b"\x01"
+
+# Already-compressed formats that are never worth another pass
+INCOMPRESSIBLE_EXTENSIONS = {
+    ".jpg", ".jpeg", ".png", ".gif", ".webp", ".heic", ".avif",
+    ".mp3", ".aac", ".ogg", ".opus", ".flac", ".m4a",
+    ".mp4", ".mkv", ".mov", ".avi", ".webm",
+    ".zip", ".gz", ".tgz", ".bz2", ".xz", ".zst", ".7z", ".rar",
+    ".docx", ".xlsx", ".pptx", ".odt", ".jar", ".apk", ".pdf",
+}
+
+# Entropy probe: number and size of sampled blocks, and the ratio that counts as a gain
+PROBE_SAMPLES = 8
+PROBE_BLOCK_SIZE = 64 * 1024
+PROBE_MAX_RATIO = 0.9
+
+class Codec:
+    """Compress and decompress single chunks for one algorithm and level."""
+
+    def __init__(self, algorithm: int, level: int = None):
+        self.algorithm = algorithm
+        if level is None or (algorithm == ZLIB and level == -1):
+            level = DEFAULT_LEVELS.get(algorithm, 0)
+        low, high = LEVEL_RANGES.get(algorithm, (0, 0))
+        if algorithm in LEVEL_RANGES and not low <= level <= high:
+            name = {v: k for k, v in ALGORITHMS.items()}[algorithm]
+            raise ValueError(f"Compression level for {name} must be between {low} and {high}.")
+        self.level = level
+        if algorithm == ZSTD:
+            try:
+                import zstandard
+            except ImportError:
+                raise ValueError("zstd compression requires the 'zstandard' package.")
+            self._zstd = zstandard
+        elif algorithm != ZLIB:
+            raise ValueError(f"Unsupported compression algorithm: {algorithm}")
+
+    def pack(self, chunk: bytes) -> bytes:
+        """Compress a chunk, falling back to storing it when compression does not help."""
+        if self.algorithm == ZLIB:
+            packed = zlib.compress(chunk, self.level)
+        else:
+            packed = self._zstd.ZstdCompressor(level=self.level).compress(chunk)
+        if len(packed) < len(chunk):
+            return COMPRESSED + packed
+        return STORED + chunk
+
+    def unpack(self, body: bytes, max_size: int) -> bytes:
+        """Reverse pack(), refusing to expand beyond max_size bytes."""
+        marker, data = body[:1], body[1:]
+        if marker == STORED:
+            return data
+        if marker != COMPRESSED:
+            raise ValueError("Invalid chunk marker.")
+        if self.algorithm == ZLIB:
+            decompressor = zlib.decompressobj()
+            chunk = decompressor.decompress(data, max_size)
+            if decompressor.unconsumed_tail or not decompressor.eof:
+                raise ValueError("Compressed chunk is malformed or too large.")
+            return chunk
+        return self._zstd.ZstdDecompressor().decompress(data, max_output_size=max_size)
+
+def parse_algorithm(name: str) -> int:
+    """Map a configuration name ('none', 'zlib', 'zstd') to its identifier."""
+    try:
+        return ALGORITHMS[(name or "none").lower()]
+    except KeyError:
+        raise ValueError(f"Unknown compression algorithm: {name}")
+
+def is_compressible(file_path: str) -> bool:
+    """
+    Cheaply guess whether compressing a file is worthwhile.
+
+    Known media and archive extensions are skipped outright. Otherwise a few
+    blocks spread over the file are compressed with fast zlib and the file
+    only qualifies if they shrink below PROBE_MAX_RATIO of their size.
+    """
+    if os.path.splitext(file_path)[1].lower() in INCOMPRESSIBLE_EXTENSIONS:
+        return False
+
+    size = os.path.getsize(file_path)
+    if size == 0:
+        return False
+
+    samples = min(PROBE_SAMPLES, max(1, size // PROBE_BLOCK_SIZE))
+    step = max(0, size - PROBE_BLOCK_SIZE) // max(1, samples - 1)
+    raw = packed = 0
+    with open(file_path, 'rb') as f:
+        for i in range(samples):
+            f.seek(i * step)
+            block = f.read(PROBE_BLOCK_SIZE)
+            raw += len(block)
+            packed += len(zlib.compress(block, 1))
+    return packed < raw * PROBE_MAX_RATIO
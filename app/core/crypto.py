@@ -1,106 +1,930 @@
 import os
+import hmac
+import functools
+import struct
+import hashlib
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
-from cryptography.hazmat.primitives import hashes
+from cryptography.exceptions import InvalidTag
+from app.core.engine import iter_chunks, run_pipeline, run_pipeline_async, settled, shared_executor
+from app.core import compression, ciphers, fileio
+from app.core.kdf import KdfParams, LEGACY, RAW_KEY
+from app.utils import trace
 
 # Security and format constants
 SALT_SIZE = 16
 NONCE_SIZE = 12
-ITERATIONS = 200_000
+KEY_SIZE = 32
+# Compatibility: PBKDF2 cost of legacy files, see kdf.LEGACY
+ITERATIONS = LEGACY.iterations
 EXTENSION = ".elock"
 
+# Streaming (v2) format constants
+MAGIC = b"ELCK"
+VERSION = 2
+TAG_SIZE = 16
+NONCE_PREFIX_SIZE = 7
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+
+# Header field identifiers. Stream fields are authenticated with every chunk,
+# key fields only describe how to obtain the key.
+FIELD_CHUNK_SIZE = 0x01
+FIELD_NONCE_PREFIX = 0x02
+FIELD_COMPRESSION = 0x03
+FIELD_CONTENT = 0x04
+FIELD_CIPHER = 0x05
+FIELD_SALT = 0x41
+FIELD_WRAPPED_KEY = 0x42
+FIELD_KEY_CHECK = 0x43
+FIELD_KDF = 0x44
+FIELD_PADDING = 0x7F
+
+# Payload types recorded in FIELD_CONTENT
+CONTENT_FILE = 0
+CONTENT_ARCHIVE = 1
+
+KEY_CHECK_SIZE = 16
+# Key blocks are padded to this size so a password change can rewrite them in place
+KEY_BLOCK_SIZE = 256
+
 class CryptoError(Exception):
     """Base exception for all cryptographic operations in EasyLock."""
     pass
 
+class InvalidPasswordError(CryptoError):
+    """Raised when the header key check shows that the password is wrong."""
+    pass
+
+class CorruptedFileError(CryptoError):
+    """Raised when the header or the payload of a file fails validation."""
+    pass
+
+class OperationCancelled(CryptoError):
+    """Raised when an operation is stopped through its cancellation token."""
+    pass
+
 def derive_key(password: str, salt: bytes) -> bytes:
-    """Derive a cryptographically strong 32-byte key using PBKDF2-HMAC-SHA256."""
-    kdf = PBKDF2HMAC(
-        algorithm=hashes.SHA256(),
-        length=32,
-        salt=salt,
-        iterations=ITERATIONS,
-    )
-    return kdf.derive(password.encode("utf-8"))
+    """
+    Derive a 32-byte key with the legacy PBKDF2 parameters (kdf.LEGACY).
 
-def encrypt_file(file_path: str, password: str, keep_original: bool = False) -> str:
+    Kept for callers of earlier versions; new files record their KDF in the
+    header, see KdfParams.derive.
     """
-    Encrypt a file using AES-256-GCM.
-    
-    Data format: [SALT (16 bytes)][NONCE (12 bytes)][CIPHERTEXT + AUTH TAG]
+    return LEGACY.derive(password, salt)
+
+class KeySession:
+    """
+    Key-encryption keys derived from one password, cached per salt.
+
+    Files locked through the same session share a single KEK salt, so a
+    batch runs the KDF once. Every file still gets its own random data key,
+    wrapped under the KEK and stored in the file header. `kdf_params` is
+    the KDF used for newly locked files (see app.utils.config.get_kdf_params
+    for the calibrated one); unlocking uses whatever the header records.
+
+    `password` may also be a raw key (bytes, e.g. a keyfile). Raw keys are
+    never stretched: new files use HKDF with a fresh salt each, whatever
+    `kdf_params` says, and those KEKs are not cached.
+    """
+
+    def __init__(self, password, kdf_params: KdfParams = None):
+        self.password = password
+        self.lock_salt = os.urandom(SALT_SIZE)
+        self.kdf_params = RAW_KEY if isinstance(password, bytes) else kdf_params or LEGACY
+        self._keks = {}
+
+    def file_salt(self) -> bytes:
+        """KEK salt for the next file locked; shared unless the KDF is cheap."""
+        return self.lock_salt if self.kdf_params.stretched else os.urandom(SALT_SIZE)
+
+    def kek(self, salt: bytes, kdf_params: KdfParams = None) -> bytes:
+        """Return the key-encryption key for salt, deriving it on first use."""
+        kdf_params = kdf_params or self.kdf_params
+        kek = self._keks.get((salt, kdf_params))
+        if kek is None:
+            with trace.span("kdf", **kdf_params.to_dict()):
+                try:
+                    kek = kdf_params.derive(self.password, salt)
+                except ValueError as e:
+                    raise CryptoError(str(e))
+            if kdf_params.stretched:
+                self._keks[(salt, kdf_params)] = kek
+        return kek
+
+def key_check(kek: bytes) -> bytes:
+    """Short verification value for a KEK, stored in the header to reject bad passwords early."""
+    return hmac.new(kek, b"EasyLock key check", hashlib.sha256).digest()[:KEY_CHECK_SIZE]
+
+def wrap_key(kek: bytes, data_key: bytes, aad: bytes) -> bytes:
+    """Seal a data key under a KEK: [NONCE (12)][ENCRYPTED KEY + AUTH TAG]."""
+    nonce = os.urandom(NONCE_SIZE)
+    return nonce + AESGCM(kek).encrypt(nonce, data_key, aad)
+
+def unwrap_key(kek: bytes, wrapped: bytes, aad: bytes) -> bytes:
+    """Recover a data key sealed with wrap_key."""
+    try:
+        return AESGCM(kek).decrypt(wrapped[:NONCE_SIZE], wrapped[NONCE_SIZE:], aad)
+    except InvalidTag:
+        raise CryptoError("Invalid password or corrupted file.")
+
+def _pack_fields(fields: dict) -> bytes:
+    """Serialize header fields as [ID (1)][LENGTH (2)][VALUE] records."""
+    out = bytearray()
+    for field_id, value in sorted(fields.items()):
+        out += struct.pack(">BH", field_id, len(value))
+        out += value
+    return bytes(out)
+
+def _unpack_fields(data: bytes) -> dict:
+    """Parse a block of header field records."""
+    fields = {}
+    pos = 0
+    while pos < len(data):
+        if pos + 3 > len(data):
+            raise CorruptedFileError("File structure is corrupted or invalid.")
+        field_id, length = struct.unpack_from(">BH", data, pos)
+        pos += 3
+        if pos + length > len(data):
+            raise CorruptedFileError("File structure is corrupted or invalid.")
+        fields[field_id] = data[pos:pos + length]
+        pos += length
+    return fields
+
+class Header:
+    """
+    Header of a v2 .elock file.
+
+    Layout: [MAGIC (4)][VERSION (1)][STREAM LEN (2)][STREAM FIELDS]
+            [KEY LEN (2)][KEY FIELDS + PADDING]
+
+    The payload is encrypted with a random per-file data key. The key fields
+    hold the KEK salt and the data key wrapped under the password-derived KEK;
+    they are not part of the chunk AAD, so they can be replaced on rekey.
+    """
+
+    def __init__(self, stream_fields: dict, key_fields: dict, key_block_size: int = None):
+        self.stream_fields = stream_fields
+        self.key_fields = key_fields
+        # Size of the key block on disk, None for headers not written yet
+        self.key_block_size = key_block_size
+
+    @classmethod
+    def new(cls, salt: bytes, chunk_size: int = DEFAULT_CHUNK_SIZE) -> "Header":
+        """Create the header of a new file; the data key is added by seal_data_key."""
+        if not 0 < chunk_size <= MAX_CHUNK_SIZE:
+            raise CryptoError(f"Chunk size must be between 1 and {MAX_CHUNK_SIZE} bytes.")
+        stream_fields = {
+            FIELD_CHUNK_SIZE: struct.pack(">I", chunk_size),
+            FIELD_NONCE_PREFIX: os.urandom(NONCE_PREFIX_SIZE),
+        }
+        return cls(stream_fields, {FIELD_SALT: salt})
+
+    @classmethod
+    def read(cls, f) -> "Header":
+        """Read a header from a file object positioned right after the magic."""
+        version = f.read(1)
+        if not version:
+            raise CorruptedFileError("File structure is corrupted or invalid.")
+        if version[0] != VERSION:
+            raise CryptoError(f"Unsupported file version: {version[0]}.")
+        stream_fields = _unpack_fields(cls._read_block(f))
+        key_block = cls._read_block(f)
+        key_fields = _unpack_fields(key_block)
+        key_fields.pop(FIELD_PADDING, None)
+        header = cls(stream_fields, key_fields, len(key_block))
+        # Validate required fields eagerly so a damaged header fails early
+        if not 0 < header.chunk_size <= MAX_CHUNK_SIZE:
+            raise CorruptedFileError("File structure is corrupted or invalid.")
+        if len(header.nonce_prefix) != NONCE_PREFIX_SIZE or len(header.salt) != SALT_SIZE:
+            raise CorruptedFileError("File structure is corrupted or invalid.")
+        if len(header.wrapped_key) != NONCE_SIZE + KEY_SIZE + TAG_SIZE:
+            raise CorruptedFileError("File structure is corrupted or invalid.")
+        if len(header.key_fields.get(FIELD_KEY_CHECK, b"")) != KEY_CHECK_SIZE:
+            raise CorruptedFileError("File structure is corrupted or invalid.")
+        header.kdf_params  # raises on unknown or out-of-range KDF parameters
+        return header
+
+    @staticmethod
+    def _read_block(f) -> bytes:
+        raw = f.read(2)
+        if len(raw) != 2:
+            raise CorruptedFileError("File structure is corrupted or invalid.")
+        (length,) = struct.unpack(">H", raw)
+        block = f.read(length)
+        if len(block) != length:
+            raise CorruptedFileError("File structure is corrupted or invalid.")
+        return block
+
+    def _field(self, fields: dict, field_id: int) -> bytes:
+        try:
+            return fields[field_id]
+        except KeyError:
+            raise CorruptedFileError("File structure is corrupted or invalid.")
+
+    @property
+    def chunk_size(self) -> int:
+        value = self._field(self.stream_fields, FIELD_CHUNK_SIZE)
+        if len(value) != 4:
+            raise CorruptedFileError("File structure is corrupted or invalid.")
+        return struct.unpack(">I", value)[0]
+
+    @property
+    def nonce_prefix(self) -> bytes:
+        return self._field(self.stream_fields, FIELD_NONCE_PREFIX)
+
+    @property
+    def content(self) -> int:
+        """Payload type: CONTENT_FILE for a single file, CONTENT_ARCHIVE for a packed folder."""
+        value = self.stream_fields.get(FIELD_CONTENT, bytes([CONTENT_FILE]))
+        if len(value) != 1:
+            raise CorruptedFileError("File structure is corrupted or invalid.")
+        return value[0]
+
+    def set_content(self, content: int):
+        self.stream_fields[FIELD_CONTENT] = bytes([content])
+
+    @property
+    def compression(self):
+        """Return (algorithm, level) of the chunk compression, or None for raw chunks."""
+        value = self.stream_fields.get(FIELD_COMPRESSION)
+        if value is None:
+            return None
+        if len(value) != 2:
+            raise CorruptedFileError("File structure is corrupted or invalid.")
+        return value[0], value[1]
+
+    def set_compression(self, algorithm: int, level: int):
+        self.stream_fields[FIELD_COMPRESSION] = bytes([algorithm, level])
+
+    @property
+    def cipher(self) -> int:
+        """Payload AEAD identifier (see app.core.ciphers); files without the field use AES-GCM."""
+        value = self.stream_fields.get(FIELD_CIPHER, bytes([ciphers.AES_GCM]))
+        if len(value) != 1:
+            raise CorruptedFileError("File structure is corrupted or invalid.")
+        return value[0]
+
+    def set_cipher(self, cipher: int):
+        self.stream_fields[FIELD_CIPHER] = bytes([cipher])
+
+    def aead(self, data_key: bytes):
+        """Return the AEAD that seals and opens the chunks of this file."""
+        try:
+            return ciphers.new_aead(self.cipher, data_key)
+        except ValueError as e:
+            raise CryptoError(str(e))
+
+    def codec(self):
+        """Return the compression Codec for this file, or None for raw chunks."""
+        if self.compression is None:
+            return None
+        try:
+            return compression.Codec(*self.compression)
+        except ValueError as e:
+            raise CryptoError(str(e))
+
+    @property
+    def salt(self) -> bytes:
+        return self._field(self.key_fields, FIELD_SALT)
+
+    @property
+    def wrapped_key(self) -> bytes:
+        return self._field(self.key_fields, FIELD_WRAPPED_KEY)
+
+    @property
+    def kdf_params(self) -> KdfParams:
+        """KDF of the key block; files written before it was recorded use LEGACY."""
+        value = self.key_fields.get(FIELD_KDF)
+        if value is None:
+            return LEGACY
+        try:
+            return KdfParams.unpack(value)
+        except ValueError:
+            raise CorruptedFileError("File structure is corrupted or invalid.")
+
+    def seal_data_key(self, session: KeySession) -> bytes:
+        """Generate a random data key for this file and store it wrapped in the header."""
+        data_key = os.urandom(KEY_SIZE)
+        self.store_data_key(data_key, session)
+        return data_key
+
+    def store_data_key(self, data_key: bytes, session: KeySession):
+        """Wrap data_key under a KEK of session, replacing any previous key fields."""
+        salt = session.file_salt()
+        kek = session.kek(salt)
+        self.key_fields[FIELD_SALT] = salt
+        self.key_fields[FIELD_KDF] = session.kdf_params.pack()
+        self.key_fields[FIELD_WRAPPED_KEY] = wrap_key(kek, data_key, self.aad)
+        self.key_fields[FIELD_KEY_CHECK] = key_check(kek)
+
+    def open_data_key(self, session: KeySession) -> bytes:
+        """
+        Unwrap the data key of this file with the session's (cached) KEK.
+
+        The key check fails right after the KDF on a wrong password, without
+        reading the payload; a failing unwrap after a passing check means the
+        header itself is damaged.
+        """
+        if not self.kdf_params.stretched and not isinstance(session.password, bytes):
+            raise InvalidPasswordError("Invalid password: this file was locked with a keyfile.")
+        kek = session.kek(self.salt, self.kdf_params)
+        if not hmac.compare_digest(self._field(self.key_fields, FIELD_KEY_CHECK), key_check(kek)):
+            raise InvalidPasswordError("Invalid password.")
+        try:
+            return unwrap_key(kek, self.wrapped_key, self.aad)
+        except CryptoError:
+            raise CorruptedFileError("File header is corrupted or invalid.")
+
+    @property
+    def aad(self) -> bytes:
+        """Associated data bound to every chunk: magic, version and stream fields."""
+        stream = _pack_fields(self.stream_fields)
+        return MAGIC + bytes([VERSION]) + struct.pack(">H", len(stream)) + stream
+
+    def pack_key_block(self) -> bytes:
+        """Serialize the key fields as [KEY LEN (2)][KEY FIELDS + PADDING]."""
+        keys = _pack_fields(self.key_fields)
+        size = self.key_block_size or max(KEY_BLOCK_SIZE, len(keys))
+        if len(keys) + 3 <= size:
+            keys += _pack_fields({FIELD_PADDING: bytes(size - len(keys) - 3)})
+        elif len(keys) != size:
+            raise CryptoError("Key parameters do not fit in the existing file header.")
+        return struct.pack(">H", len(keys)) + keys
+
+    def pack(self) -> bytes:
+        return self.aad + self.pack_key_block()
+
+def check_compression(compress: str, compress_level: int = None):
+    """Return the Codec for a compression setting, or None; raises CryptoError if it is invalid."""
+    try:
+        algorithm = compression.parse_algorithm(compress)
+        if algorithm == compression.NONE:
+            return None
+        return compression.Codec(algorithm, compress_level)
+    except ValueError as e:
+        raise CryptoError(str(e))
+
+def apply_compression(header: Header, compress: str, compress_level: int = None,
+                      probe_path: str = None):
+    """Record the requested compression in header, unless probe_path looks incompressible."""
+    codec = check_compression(compress, compress_level)
+    if codec is None:
+        return
+    if probe_path is not None and not compression.is_compressible(probe_path):
+        return
+    header.set_compression(codec.algorithm, codec.level)
+
+def apply_cipher(header: Header, cipher: str = None):
+    """Record the payload cipher ('aes-gcm' when None, or 'chacha20-poly1305') in header."""
+    try:
+        header.set_cipher(ciphers.parse_cipher(cipher))
+    except ValueError as e:
+        raise CryptoError(str(e))
+
+def _io_mode(io_mode: str) -> str:
+    try:
+        return fileio.parse_io_mode(io_mode)
+    except ValueError as e:
+        raise CryptoError(str(e))
+
+def sealed_size(header: Header, plain_size: int):
+    """Final size of a file sealed with header, or None when compression makes it unknown."""
+    if header.compression is not None:
+        return None
+    chunks = max(1, -(-plain_size // header.chunk_size))
+    return len(header.pack()) + plain_size + chunks * TAG_SIZE
+
+def opened_size(header: Header, payload_size: int):
+    """Plaintext size of a payload of payload_size sealed bytes, or None if compressed."""
+    if header.compression is not None:
+        return None
+    chunks = max(1, -(-payload_size // (header.chunk_size + TAG_SIZE)))
+    return max(payload_size - chunks * TAG_SIZE, 0)
+
+def read_header(file_path: str):
+    """Return the Header of a v2 .elock file, or None for a legacy v1 file."""
+    with open(file_path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            return None
+        return Header.read(f)
+
+def chunk_nonce(prefix: bytes, index: int, final: bool) -> bytes:
+    """Build the nonce of a chunk: [PREFIX (7)][INDEX (4)][FINAL FLAG (1)]."""
+    if index > 0xFFFFFFFF:
+        raise CryptoError("File is too large for the configured chunk size.")
+    return prefix + struct.pack(">I", index) + (b"\x01" if final else b"\x00")
+
+def monitored(write, position, total: int, progress=None, cancel=None, throttle=None):
+    """
+    Wrap a chunk writer to report progress and honour a cancellation token.
+
+    progress(done, total) is called after every chunk with the source bytes
+    consumed so far, as reported by position() (usually the source's tell).
+    cancel is any object with an is_set() method, e.g. threading.Event.
+    throttle(nbytes) is called with the size of every chunk written and may
+    sleep to cap throughput (see app.core.scheduler.Scheduler.throttle).
+    """
+    if progress is None and cancel is None and throttle is None:
+        return write
+
+    start = position() if progress is not None else 0
+
+    def write_chunk(data):
+        if cancel is not None and cancel.is_set():
+            raise OperationCancelled("Operation cancelled.")
+        write(data)
+        if throttle is not None:
+            throttle(len(data))
+        if progress is not None:
+            progress(min(position() - start, total), total)
+
+    return write_chunk
+
+def iter_records(src, max_size: int):
+    """
+    Yield (index, final, record) for length-prefixed records [LEN (4)][RECORD].
+
+    Used for compressed files, whose sealed chunks vary in size. A damaged
+    length prefix surfaces as an authentication failure or CorruptedFileError.
+    """
+    def read_record():
+        raw = src.read(4)
+        if not raw:
+            return None
+        if len(raw) != 4:
+            raise CorruptedFileError("File structure is corrupted or invalid.")
+        (length,) = struct.unpack(">I", raw)
+        record = src.read(length) if length <= max_size else b""
+        if len(record) != length:
+            raise CorruptedFileError("File structure is corrupted or invalid.")
+        return record
+
+    index = 0
+    record = read_record()
+    if record is None:
+        raise CorruptedFileError("File structure is corrupted or invalid.")
+    while True:
+        following = read_record()
+        final = following is None
+        yield index, final, record
+        if final:
+            return
+        record = following
+        index += 1
+
+class _TimedReader:
+    """Source wrapper adding read time to a trace span."""
+
+    def __init__(self, src, span):
+        self.read = span.timed("read", src.read)
+
+def _timed_phases(span, src, transform, write):
+    """Split pipeline time of a traced span into read, aead and write phases."""
+    return _TimedReader(src, span), span.timed("aead", transform), span.timed("write", write)
+
+def _sealer(aead, header: Header):
+    """Return the transform(index, final, chunk) that seals the chunks of header's file."""
+    prefix = header.nonce_prefix
+    aad = header.aad
+    codec = header.codec()
+
+    def seal(index, final, chunk):
+        nonce = chunk_nonce(prefix, index, final)
+        if codec is None:
+            return aead.encrypt(nonce, chunk, aad)
+        sealed = aead.encrypt(nonce, codec.pack(chunk), aad)
+        return struct.pack(">I", len(sealed)) + sealed
+
+    return seal
+
+def _opener(aead, header: Header):
+    """Return the transform(index, final, record) that opens the chunks of header's file."""
+    prefix = header.nonce_prefix
+    aad = header.aad
+    chunk_size = header.chunk_size
+    codec = header.codec()
+
+    def open_chunk(index, final, record):
+        try:
+            body = aead.decrypt(chunk_nonce(prefix, index, final), record, aad)
+        except InvalidTag:
+            # The key was verified through the header, so this is damage, not a bad password
+            raise CorruptedFileError("File is corrupted or invalid.")
+        if codec is None:
+            return body
+        try:
+            return codec.unpack(body, chunk_size)
+        except Exception:
+            raise CorruptedFileError("File is corrupted or invalid.")
+
+    return open_chunk
+
+def _sealed_records(src, header: Header):
+    """Iterate over the sealed chunks of src, which is positioned after the header."""
+    if header.compression is None:
+        return iter_chunks(src, header.chunk_size + TAG_SIZE)
+    # Compressed bodies carry a one-byte marker and never exceed the raw chunk
+    return iter_records(src, header.chunk_size + 1 + TAG_SIZE)
+
+def seal_chunks(src, dst, aead, header: Header, workers: int = None, write=None):
+    """Encrypt src into dst chunk by chunk on the parallel chunk pipeline."""
+    seal = _sealer(aead, header)
+    write = write or dst.write
+    span = trace.current()
+    if span is not None:
+        src, seal, write = _timed_phases(span, src, seal, write)
+    run_pipeline(iter_chunks(src, header.chunk_size), seal, write, workers)
+
+def open_chunks(src, dst, aead, header: Header, workers: int = None, write=None):
+    """Decrypt and authenticate src into dst chunk by chunk on the parallel chunk pipeline."""
+    open_chunk = _opener(aead, header)
+    write = write or dst.write
+    span = trace.current()
+    if span is not None:
+        src, open_chunk, write = _timed_phases(span, src, open_chunk, write)
+    run_pipeline(_sealed_records(src, header), open_chunk, write, workers)
+
+class _PipeReader:
+    """
+    Read adapter for pipes and other non-seekable sources.
+
+    read(n) keeps reading until n bytes or end of stream, since a raw pipe
+    returns short reads that would otherwise look like the final chunk.
+    `pending` bytes, consumed earlier while sniffing the format, come first.
+    """
+
+    def __init__(self, f, pending: bytes = b""):
+        self._f = f
+        self._pending = pending
+
+    def read(self, size: int) -> bytes:
+        parts = [self._pending[:size]]
+        self._pending = self._pending[size:]
+        got = len(parts[0])
+        while got < size:
+            block = self._f.read(size - got)
+            if not block:
+                break
+            parts.append(block)
+            got += len(block)
+        return b"".join(parts)
+
+def _open_v1(src, dst, session: KeySession, write=None):
+    """
+    Stream-decrypt a legacy v1 file: [SALT (16)][NONCE (12)][CIPHERTEXT][TAG (16)].
+
+    The GCM tag sits at the end of the file; the last TAG_SIZE bytes read are
+    held back until the source is exhausted, so no seeking is needed.
+    """
+    salt = src.read(SALT_SIZE)
+    nonce = src.read(NONCE_SIZE)
+    if len(salt) != SALT_SIZE or len(nonce) != NONCE_SIZE:
+        raise CorruptedFileError("File structure is corrupted or invalid.")
+
+    # v1 files are encrypted with the password-derived key directly
+    key = session.kek(salt, LEGACY)
+    decryptor = Cipher(algorithms.AES(key), modes.GCM(nonce)).decryptor()
+    write = write or dst.write
+    tail = b""
+    while True:
+        block = src.read(DEFAULT_CHUNK_SIZE)
+        if not block:
+            break
+        data = tail + block
+        tail = data[-TAG_SIZE:]
+        write(decryptor.update(data[:-TAG_SIZE]))
+    if len(tail) != TAG_SIZE:
+        raise CorruptedFileError("File structure is corrupted or invalid.")
+    try:
+        dst.write(decryptor.finalize_with_tag(tail))
+    except InvalidTag:
+        raise CryptoError("Invalid password or corrupted file.")
+
+def encrypt_file(file_path: str, password: str, keep_original: bool = False,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE, workers: int = None,
+                 session: KeySession = None, progress=None, cancel=None,
+                 compress: str = None, compress_level: int = None, cipher: str = None,
+                 io_mode: str = None, throttle=None) -> str:
+    """
+    Encrypt a file using AES-256-GCM (or ChaCha20-Poly1305) in independently sealed chunks.
+
+    Data format: [HEADER][CHUNK 0 + AUTH TAG]...[CHUNK N + AUTH TAG]
+    Each chunk nonce carries the chunk index and a final-chunk flag, so
+    reordered, dropped or truncated chunks fail authentication. Chunks are
+    sealed on `workers` threads (defaults to the CPU count); the output is
+    identical whatever the worker count.
+
+    Passing a KeySession lets a batch of files share one KDF run; `password`
+    is ignored in that case. progress(done, total) reports source bytes
+    processed; setting the `cancel` event aborts and removes the output.
+
+    `compress` ('zlib' or 'zstd') compresses each chunk before sealing,
+    unless a quick probe finds the file incompressible. Chunks are then
+    stored as [LEN (4)][CHUNK + AUTH TAG]. `cipher` selects the payload
+    AEAD ('aes-gcm' by default, or 'chacha20-poly1305').
+
+    `io_mode` ('buffered', 'nocache' or 'direct', see app.core.fileio) keeps
+    huge files from flushing the page cache of other services, and
+    throttle(nbytes), called per chunk written, can cap throughput.
     """
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"Source file not found: {file_path}")
-    
+
     if file_path.endswith(EXTENSION):
         raise CryptoError("File is already encrypted.")
 
     try:
-        salt = os.urandom(SALT_SIZE)
-        key = derive_key(password, salt)
-        aesgcm = AESGCM(key)
-        nonce = os.urandom(NONCE_SIZE)
+        session = session or KeySession(password)
+        header = Header.new(session.lock_salt, chunk_size)
+        apply_compression(header, compress, compress_level, probe_path=file_path)
+        apply_cipher(header, cipher)
+        io_mode = _io_mode(io_mode)
+        aead = header.aead(header.seal_data_key(session))
+        output_path = file_path + EXTENSION
 
-        with open(file_path, 'rb') as f:
-            data = f.read()
+        size = os.path.getsize(file_path)
+        with trace.span("encrypt", bytes=size, compressed=header.compression is not None), \
+                fileio.open_reader(file_path, io_mode) as src, \
+                fileio.open_writer(output_path, io_mode, sealed_size(header, size)) as dst:
+            dst.write(header.pack())
+            write = monitored(dst.write, src.tell, size, progress, cancel, throttle)
+            seal_chunks(src, dst, aead, header, workers, write)
 
-        ciphertext = aesgcm.encrypt(nonce, data, None)
-        output_path = file_path + EXTENSION
-        
-        with open(output_path, 'wb') as f:
-            f.write(salt)
-            f.write(nonce)
-            f.write(ciphertext)
-            
         if not keep_original:
-            os.remove(file_path)
-            
+            with trace.span("remove"):
+                os.remove(file_path)
+
         return output_path
     except Exception as e:
         if 'output_path' in locals() and os.path.exists(output_path):
             os.remove(output_path)
         raise e
 
-def decrypt_file(file_path: str, password: str, keep_original: bool = False) -> str:
+def _decrypted_path(file_path: str) -> str:
+    output_path = file_path[:-len(EXTENSION)]
+
+    # Prevent collision with an existing file by appending a suffix
+    if os.path.exists(output_path):
+        base, ext = os.path.splitext(output_path)
+        output_path = f"{base}_decrypted{ext}"
+    return output_path
+
+def decrypt_file(file_path: str, password: str, keep_original: bool = False,
+                 workers: int = None, session: KeySession = None,
+                 progress=None, cancel=None, io_mode: str = None, throttle=None) -> str:
     """
     Decrypt a .elock file and restore the original content.
+
+    Both the chunked v2 format and the legacy single-block v1 format are
+    supported; the output is removed again if authentication fails. With a
+    KeySession, KEKs are cached per salt so a batch unlock derives each once.
+    progress, cancel, io_mode and throttle behave as in encrypt_file. Folder archives
+    are extracted into a directory, whose path is returned.
     """
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"Encrypted file not found: {file_path}")
-    
+
     if not file_path.endswith(EXTENSION):
         raise CryptoError("File format not supported (missing .elock extension).")
 
+    header = read_header(file_path)
+    if header is not None and header.content == CONTENT_ARCHIVE:
+        # Imported here, the archive module builds on this one
+        from app.core.archive import decrypt_archive
+        return decrypt_archive(file_path, password, keep_original, workers, session,
+                               progress, cancel, io_mode, throttle)
+
+    output_path = _decrypted_path(file_path)
+    created = False
+    total_size = os.path.getsize(file_path)
     try:
-        with open(file_path, 'rb') as f:
-            salt = f.read(SALT_SIZE)
-            nonce = f.read(NONCE_SIZE)
-            ciphertext = f.read()
-            
-        if len(salt) != SALT_SIZE or len(nonce) != NONCE_SIZE:
-            raise CryptoError("File structure is corrupted or invalid.")
-
-        key = derive_key(password, salt)
-        aesgcm = AESGCM(key)
-        
-        try:
-            plaintext = aesgcm.decrypt(nonce, ciphertext, None)
-        except Exception:
-            raise CryptoError("Invalid password or corrupted file.")
-            
-        output_path = file_path[:-len(EXTENSION)]
-        
-        # Prevent collision with an existing file by appending a suffix
-        if os.path.exists(output_path):
-            base, ext = os.path.splitext(output_path)
-            output_path = f"{base}_decrypted{ext}"
-            
-        with open(output_path, 'wb') as f:
-            f.write(plaintext)
-            
+        io_mode = _io_mode(io_mode)
+        with trace.span("decrypt", bytes=total_size), fileio.open_reader(file_path, io_mode) as src:
+            if src.read(len(MAGIC)) == MAGIC:
+                header = Header.read(src)
+                session = session or KeySession(password)
+                aead = header.aead(header.open_data_key(session))
+                expected = opened_size(header, total_size - src.tell())
+                with fileio.open_writer(output_path, io_mode, expected) as dst:
+                    created = True
+                    write = monitored(dst.write, src.tell, total_size - src.tell(), progress, cancel,
+                                      throttle)
+                    open_chunks(src, dst, aead, header, workers, write)
+            else:
+                src.seek(0)
+                expected = total_size - SALT_SIZE - NONCE_SIZE - TAG_SIZE
+                with fileio.open_writer(output_path, io_mode, expected) as dst:
+                    created = True
+                    write = monitored(dst.write, src.tell, total_size, progress, cancel, throttle)
+                    _open_v1(src, dst, session or KeySession(password), write)
+
         if not keep_original:
-            os.remove(file_path)
-            
+            with trace.span("remove"):
+                os.remove(file_path)
+
         return output_path
     except Exception as e:
+        # Chunks are written as they are verified, never leave partial plaintext behind
+        if created and os.path.exists(output_path):
+            os.remove(output_path)
         raise e
+
+def encrypt_stream(src, dst, password: str, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                   workers: int = None, session: KeySession = None, cancel=None,
+                   compress: str = None, compress_level: int = None, cipher: str = None):
+    """
+    Encrypt everything read from the binary stream src into dst.
+
+    Neither stream has to be seekable, so pipes work, and memory stays
+    bounded by the chunks in flight on the pipeline. The output is an
+    ordinary v2 .elock file. Nothing is probed before compressing.
+    """
+    session = session or KeySession(password)
+    header = Header.new(session.lock_salt, chunk_size)
+    apply_compression(header, compress, compress_level)
+    apply_cipher(header, cipher)
+    aead = header.aead(header.seal_data_key(session))
+
+    dst.write(header.pack())
+    write = monitored(dst.write, None, 0, cancel=cancel)
+    with trace.span("encrypt_stream"):
+        seal_chunks(_PipeReader(src), dst, aead, header, workers, write)
+    dst.flush()
+
+def decrypt_stream(src, dst, password: str, workers: int = None,
+                   session: KeySession = None, cancel=None):
+    """
+    Decrypt a .elock file read from the binary stream src into dst.
+
+    Works on non-seekable pipes for both v2 and v1 files. Each v2 chunk is
+    authenticated before it is written, but a stream cut short is only
+    detected at its end, after earlier plaintext has been passed on; callers
+    must treat an exception as a failed run. Folder archives are rejected.
+    """
+    reader = _PipeReader(src)
+    magic = reader.read(len(MAGIC))
+    write = monitored(dst.write, None, 0, cancel=cancel)
+    if magic == MAGIC:
+        header = Header.read(reader)
+        if header.content == CONTENT_ARCHIVE:
+            raise CryptoError("Folder archives cannot be unlocked to a stream.")
+        aead = header.aead(header.open_data_key(session or KeySession(password)))
+        with trace.span("decrypt_stream"):
+            open_chunks(reader, dst, aead, header, workers, write)
+    else:
+        _open_v1(_PipeReader(src, magic), dst, session or KeySession(password), write)
+    dst.flush()
+
+def rekey_file(file_path: str, old_password: str, new_password: str,
+               old_session: KeySession = None, new_session: KeySession = None):
+    """
+    Change the password of a v2 .elock file without touching its payload.
+
+    Only the wrapped data key in the header changes. Key blocks are padded to
+    a fixed size when the file is created, so the new block is written over
+    the old one with a single write and fsync. The whole header sits inside
+    the first disk sector, which storage devices update atomically. Sessions
+    let a batch of files share the KDF cost of both passwords.
+    """
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"Encrypted file not found: {file_path}")
+
+    if not file_path.endswith(EXTENSION):
+        raise CryptoError("File format not supported (missing .elock extension).")
+
+    old_session = old_session or KeySession(old_password)
+    new_session = new_session or KeySession(new_password)
+
+    with open(file_path, 'r+b') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise CryptoError("Only v2 .elock files can be rekeyed in place.")
+        header = Header.read(f)
+        data_key = header.open_data_key(old_session)
+        header.store_data_key(data_key, new_session)
+        block = header.pack_key_block()
+
+        with trace.span("rekey_write", bytes=len(block)):
+            f.seek(len(header.aad))
+            f.write(block)
+            f.flush()
+            os.fsync(f.fileno())
+
+# Asyncio API. The blocking functions above stay the reference implementation;
+# these variants keep an event loop responsive while files are processed.
+
+async def _run_cancellable(executor, func, *args, **kwargs):
+    """
+    Run a blocking operation that accepts a `cancel` event on executor.
+
+    Cancelling the awaiting task sets the event and waits until the
+    operation has stopped and removed its partial output.
+    """
+    import asyncio
+    import threading
+
+    cancel = threading.Event()
+    future = asyncio.get_running_loop().run_in_executor(
+        executor, functools.partial(func, *args, cancel=cancel, **kwargs))
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        cancel.set()
+        await asyncio.wait([future])
+        if not future.cancelled():
+            future.exception()
+        raise
+
+async def encrypt_file_async(file_path: str, password: str, keep_original: bool = False,
+                             chunk_size: int = DEFAULT_CHUNK_SIZE, session: KeySession = None,
+                             executor=None, compress: str = None, compress_level: int = None,
+                             cipher: str = None) -> str:
+    """
+    Asyncio variant of encrypt_file that never blocks the event loop.
+
+    The KDF and the chunk AEAD run on `executor`, by default the pool from
+    app.core.engine.shared_executor, so concurrent requests share one
+    bounded set of threads. File reads and writes go through the loop's
+    default executor one chunk at a time. Cancelling the task removes the
+    partial output and leaves the source in place. The output is identical
+    to encrypt_file's.
+    """
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    executor = executor or shared_executor()
+
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"Source file not found: {file_path}")
+
+    if file_path.endswith(EXTENSION):
+        raise CryptoError("File is already encrypted.")
+
+    session = session or KeySession(password)
+    header = Header.new(session.lock_salt, chunk_size)
+    await settled(loop.run_in_executor(None, apply_compression, header, compress, compress_level, file_path))
+    apply_cipher(header, cipher)
+    aead = header.aead(await loop.run_in_executor(executor, header.seal_data_key, session))
+    output_path = file_path + EXTENSION
+
+    try:
+        with open(file_path, 'rb') as src, open(output_path, 'wb') as dst:
+            dst.write(header.pack())
+            await run_pipeline_async(iter_chunks(src, header.chunk_size), _sealer(aead, header),
+                                     dst.write, executor)
+    except BaseException:
+        # BaseException so that cancellation cleans up as well
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        raise
+
+    if not keep_original:
+        await settled(loop.run_in_executor(None, os.remove, file_path))
+    return output_path
+
+async def decrypt_file_async(file_path: str, password: str, keep_original: bool = False,
+                             session: KeySession = None, executor=None) -> str:
+    """
+    Asyncio variant of decrypt_file, see encrypt_file_async.
+
+    Legacy v1 files and folder archives are handed to decrypt_file as one
+    job on `executor`; cancellation still stops them and removes the output.
+    """
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    executor = executor or shared_executor()
+
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"Encrypted file not found: {file_path}")
+
+    if not file_path.endswith(EXTENSION):
+        raise CryptoError("File format not supported (missing .elock extension).")
+
+    header = read_header(file_path)
+    if header is None or header.content == CONTENT_ARCHIVE:
+        return await _run_cancellable(executor, decrypt_file, file_path, password, keep_original,
+                                      workers=1, session=session)
+
+    session = session or KeySession(password)
+    aead = header.aead(await loop.run_in_executor(executor, header.open_data_key, session))
+    output_path = _decrypted_path(file_path)
+
+    created = False
+    try:
+        with open(file_path, 'rb') as src:
+            src.read(len(MAGIC))
+            Header.read(src)
+            with open(output_path, 'wb') as dst:
+                created = True
+                await run_pipeline_async(_sealed_records(src, header), _opener(aead, header),
+                                         dst.write, executor)
+    except BaseException:
+        # Chunks are written as they are verified, never leave partial plaintext behind
+        if created and os.path.exists(output_path):
+            os.remove(output_path)
+        raise
+
+    if not keep_original:
+        await settled(loop.run_in_executor(None, os.remove, file_path))
+    return output_path
@@ -0,0 +1,122 @@
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Default number of threads sealing/opening chunks concurrently
+DEFAULT_WORKERS = os.cpu_count() or 1
+# Chunks one async operation may have on the shared pool at once
+ASYNC_DEPTH = 4
+
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+def iter_chunks(src, size: int):
+    """
+    Yield (index, final, data) for consecutive reads of `size` bytes from src.
+
+    One chunk is read ahead so the last one can be flagged as final. At least
+    one (possibly empty) chunk is always produced.
+    """
+    index = 0
+    chunk = src.read(size)
+    while True:
+        following = src.read(size) if len(chunk) == size else b""
+        final = not following
+        yield index, final, chunk
+        if final:
+            return
+        chunk = following
+        index += 1
+
+def run_pipeline(chunks, transform, write, workers: int = None):
+    """
+    Apply transform(index, final, data) to every chunk and write the results in order.
+
+    With more than one worker, chunks are transformed on a thread pool while
+    the calling thread keeps reading and writing. The AEAD primitives release
+    the GIL, so sealing scales with cores. At most 2 * workers chunks are in
+    flight, which keeps memory bounded regardless of the input size.
+    """
+    workers = workers or DEFAULT_WORKERS
+    chunks = iter(chunks)
+
+    first = next(chunks)
+    if workers <= 1 or first[1]:
+        # Serial path, also used for single-chunk inputs to skip pool start-up
+        write(transform(*first))
+        for item in chunks:
+            write(transform(*item))
+        return
+
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="easylock") as pool:
+        try:
+            pending.append(pool.submit(transform, *first))
+            for item in chunks:
+                pending.append(pool.submit(transform, *item))
+                if len(pending) >= workers * 2:
+                    write(pending.popleft().result())
+            while pending:
+                write(pending.popleft().result())
+        finally:
+            for future in pending:
+                future.cancel()
+
+def shared_executor() -> ThreadPoolExecutor:
+    """
+    Thread pool shared by all async operations, created on first use.
+
+    It is bounded to DEFAULT_WORKERS threads, so any number of concurrent
+    lock/unlock requests together never run more KDF or AEAD work at once
+    than there are cores.
+    """
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            _shared_pool = ThreadPoolExecutor(max_workers=DEFAULT_WORKERS,
+                                              thread_name_prefix="easylock-async")
+        return _shared_pool
+
+async def settled(future):
+    """
+    Await an executor future; if the awaiting task is cancelled, wait for the
+    call to return before re-raising, so files are not closed under it.
+    """
+    import asyncio
+
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        await asyncio.wait([future])
+        if not future.cancelled():
+            future.exception()
+        raise
+
+async def run_pipeline_async(chunks, transform, write, executor, depth: int = ASYNC_DEPTH):
+    """
+    Event-loop counterpart of run_pipeline.
+
+    Chunks are read and written one at a time on the loop's default executor
+    and transformed on `executor`, with up to `depth` in flight, so the loop
+    itself never blocks. Cancellation takes effect between chunks.
+    """
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    chunks = iter(chunks)
+    pending = deque()
+    try:
+        while True:
+            item = await settled(loop.run_in_executor(None, next, chunks, None))
+            if item is None:
+                break
+            pending.append(loop.run_in_executor(executor, transform, *item))
+            if len(pending) >= depth:
+                await settled(loop.run_in_executor(None, write, await pending.popleft()))
+        while pending:
+            await settled(loop.run_in_executor(None, write, await pending.popleft()))
+    finally:
+        for future in pending:
+            if not future.cancel() and not future.cancelled():
+                future.exception()
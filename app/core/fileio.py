@@ -0,0 +1,249 @@
+"""
+File I/O backends for the chunk pipeline.
+
+"buffered" uses plain Python file objects. "nocache" streams through the
+page cache without filling it: the input is advised SEQUENTIAL and every
+window already processed is dropped with POSIX_FADV_DONTNEED, the output
+after it has been flushed to disk. "direct" bypasses the page cache with
+O_DIRECT and page-aligned buffers on Linux. Both preallocate the output
+when its final size is known. Features the platform or filesystem lacks
+(O_DIRECT on tmpfs, fadvise on Windows, ...) degrade to the simpler mode.
+"""
+import os
+import sys
+import mmap
+import functools
+
+IO_MODES = ("buffered", "nocache", "direct")
+
+# Bytes processed between page cache drops in nocache mode
+WINDOW = 32 * 1024 * 1024
+# O_DIRECT transfer sizes, offsets and buffers are multiples of this
+ALIGNMENT = 4096
+DIRECT_BUFFER = 8 * 1024 * 1024
+
+def parse_io_mode(name: str) -> str:
+    """Validate an I/O mode name; None means 'buffered'."""
+    mode = (name or "buffered").lower()
+    if mode not in IO_MODES:
+        raise ValueError(f"Unknown I/O mode: {name}")
+    return mode
+
+def _fadvise(fd: int, offset: int, length: int, advice: str):
+    advice = getattr(os, advice, None)
+    if advice is None:
+        return
+    try:
+        os.posix_fadvise(fd, offset, length, advice)
+    except OSError:
+        pass
+
+@functools.lru_cache(maxsize=1)
+def _fallocate():
+    import ctypes
+    import ctypes.util
+
+    libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    func = getattr(libc, "fallocate64", None) or libc.fallocate
+    func.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_int64, ctypes.c_int64]
+    return func
+
+def preallocate(fd: int, size: int):
+    """
+    Reserve size bytes for fd so a huge output is laid out contiguously.
+
+    Uses fallocate(2) directly: unlike posix_fallocate it fails instead of
+    writing zeros on filesystems without support, which is then skipped.
+    """
+    if size <= 0 or not sys.platform.startswith("linux"):
+        return
+    try:
+        _fallocate()(fd, 0, 0, size)
+    except (OSError, AttributeError):
+        pass
+
+def _open_fd(path: str, flags: int, direct: bool):
+    """Open path, with O_DIRECT if requested and accepted; returns (fd, direct)."""
+    flags |= getattr(os, "O_BINARY", 0)
+    if direct and hasattr(os, "O_DIRECT"):
+        try:
+            return os.open(path, flags | os.O_DIRECT, 0o666), True
+        except OSError:
+            # EINVAL on filesystems without O_DIRECT, such as tmpfs
+            pass
+    return os.open(path, flags, 0o666), False
+
+class CacheFriendlyReader:
+    """Sequential reader with read(n), tell() and seek(pos) for the nocache and direct modes."""
+
+    def __init__(self, path: str, direct: bool = False):
+        self.fd, self.direct = _open_fd(path, os.O_RDONLY, direct)
+        self._pos = 0
+        self._dropped = 0
+        if self.direct:
+            self._buf = mmap.mmap(-1, DIRECT_BUFFER)
+            self._data = b""
+            self._offset = 0
+        else:
+            self._f = os.fdopen(self.fd, 'rb', closefd=False)
+            _fadvise(self.fd, 0, 0, "POSIX_FADV_SEQUENTIAL")
+
+    def read(self, size: int = -1) -> bytes:
+        if not self.direct:
+            data = self._f.read(size)
+            self._pos += len(data)
+            if self._pos - self._dropped >= WINDOW:
+                _fadvise(self.fd, self._dropped, self._pos - self._dropped, "POSIX_FADV_DONTNEED")
+                self._dropped = self._pos
+            return data
+
+        parts = []
+        wanted = size if size >= 0 else float("inf")
+        while wanted > 0:
+            if self._offset >= len(self._data):
+                self._data = self._buf[:os.readv(self.fd, [self._buf])]
+                self._offset = 0
+                if not self._data:
+                    break
+            part = self._data[self._offset:self._offset + min(wanted, len(self._data))]
+            self._offset += len(part)
+            wanted -= len(part)
+            parts.append(part)
+        data = b"".join(parts)
+        self._pos += len(data)
+        return data
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, pos: int):
+        if not self.direct:
+            self._f.seek(pos)
+        else:
+            # Reads must start on an aligned offset, skip into the block
+            aligned = pos - pos % ALIGNMENT
+            os.lseek(self.fd, aligned, os.SEEK_SET)
+            self._data = b""
+            self._offset = 0
+            self.read(pos - aligned)
+        self._pos = pos
+        self._dropped = min(self._dropped, pos)
+
+    def close(self):
+        if self.fd is None:
+            return
+        if self.direct:
+            self._buf.close()
+        else:
+            self._f.close()
+            _fadvise(self.fd, 0, 0, "POSIX_FADV_DONTNEED")
+        os.close(self.fd)
+        self.fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+class CacheFriendlyWriter:
+    """
+    Sequential writer for the nocache and direct modes.
+
+    With `size`, the file is preallocated and truncated to the bytes actually
+    written on close, so an estimate that is off never leaves stray bytes.
+    """
+
+    def __init__(self, path: str, direct: bool = False, size: int = None):
+        self.fd, self.direct = _open_fd(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, direct)
+        self._pos = 0
+        self._dropped = 0
+        if size:
+            preallocate(self.fd, size)
+        if self.direct:
+            self._buf = mmap.mmap(-1, DIRECT_BUFFER)
+            self._fill = 0
+
+    def write(self, data) -> int:
+        if not self.direct:
+            written = len(data)
+            view = memoryview(data)
+            while view:
+                view = view[os.write(self.fd, view):]
+            self._pos += written
+            if self._pos - self._dropped >= WINDOW:
+                self._drop()
+            return written
+
+        view = memoryview(data)
+        while view:
+            n = min(len(view), DIRECT_BUFFER - self._fill)
+            self._buf[self._fill:self._fill + n] = view[:n]
+            self._fill += n
+            view = view[n:]
+            if self._fill == DIRECT_BUFFER:
+                self._flush_direct(DIRECT_BUFFER)
+        self._pos += len(data)
+        return len(data)
+
+    def _drop(self):
+        """Write back and evict the pages written since the last drop."""
+        if hasattr(os, "fdatasync"):
+            os.fdatasync(self.fd)
+        else:
+            os.fsync(self.fd)
+        _fadvise(self.fd, self._dropped, self._pos - self._dropped, "POSIX_FADV_DONTNEED")
+        self._dropped = self._pos
+
+    def _flush_direct(self, length: int):
+        view = memoryview(self._buf)[:length]
+        while view:
+            view = view[os.write(self.fd, view):]
+        self._fill = 0
+
+    def close(self):
+        if self.fd is None:
+            return
+        try:
+            if self.direct:
+                aligned = self._fill - self._fill % ALIGNMENT
+                if aligned:
+                    tail = self._buf[aligned:self._fill]
+                    self._flush_direct(aligned)
+                    self._buf[:len(tail)] = tail
+                    self._fill = len(tail)
+                if self._fill:
+                    # The unaligned tail cannot go through O_DIRECT
+                    import fcntl
+                    flags = fcntl.fcntl(self.fd, fcntl.F_GETFL)
+                    fcntl.fcntl(self.fd, fcntl.F_SETFL, flags & ~os.O_DIRECT)
+                    self._flush_direct(self._fill)
+                self._buf.close()
+            os.ftruncate(self.fd, self._pos)
+            if not self.direct:
+                self._drop()
+        finally:
+            os.close(self.fd)
+            self.fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+def open_reader(path: str, io_mode: str = None):
+    """Open path for sequential reading in the given I/O mode."""
+    mode = parse_io_mode(io_mode)
+    if mode == "buffered":
+        return open(path, 'rb')
+    return CacheFriendlyReader(path, direct=mode == "direct")
+
+def open_writer(path: str, io_mode: str = None, size: int = None):
+    """Create path for sequential writing; size is the expected final size, if known."""
+    mode = parse_io_mode(io_mode)
+    if mode == "buffered":
+        return open(path, 'wb')
+    return CacheFriendlyWriter(path, direct=mode == "direct", size=size)
@@ -0,0 +1,121 @@
+import os
+import sys
+import json
+import stat
+import socket
+import getpass
+import tempfile
+
+# Commands a running tray instance can take over from a short-lived process
+FORWARDED_COMMANDS = ("lock", "unlock", "rekey")
+CONNECT_TIMEOUT = 0.5
+# Once connected, the tray may be busy (keyring lookup, KDF calibration) before
+# it reads the request; giving up earlier would run the request twice
+REPLY_TIMEOUT = 30.0
+REPLY_OK = b"ok\n"
+
+def _runtime_dir() -> str:
+    """
+    Directory of the tray socket: XDG_RUNTIME_DIR, or a private per-user
+    directory in the temp dir. A shared directory would let another user
+    bind the socket first and swallow lock requests.
+    """
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir:
+        return runtime_dir
+    path = os.path.join(tempfile.gettempdir(), f"easylock-{os.getuid()}")
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise PermissionError(f"Unsafe socket directory: {path}")
+    return path
+
+def server_name() -> str:
+    """
+    Return the per-user local socket name of the tray daemon.
+
+    On Windows this is a named pipe name, elsewhere an absolute Unix socket
+    path. Both are understood by QLocalServer.listen(). Raises OSError if
+    there is no private directory for the socket.
+    """
+    user = getpass.getuser()
+    if sys.platform == 'win32':
+        return f"EasyLock-{user}"
+    return os.path.join(_runtime_dir(), f"easylock-{user}.sock")
+
+def resolve_open(args):
+    """
+    Expand `open <paths>`, used by the "Open With" desktop entry, into a command:
+    unlock when every path is a .elock file, lock otherwise. Without paths the
+    tray starts.
+    """
+    if not args or args[0] != "open":
+        return args
+    paths = args[1:]
+    if not paths:
+        return []
+    return ["unlock" if all(p.endswith(".elock") for p in paths) else "lock"] + paths
+
+def encode_request(command: str, paths) -> bytes:
+    """Serialize a request as a single JSON line."""
+    payload = {"command": command, "paths": [os.path.abspath(p) for p in paths]}
+    return json.dumps(payload).encode("utf-8") + b"\n"
+
+def decode_request(data: bytes):
+    """Parse a request line, returning (command, paths) or None if it is invalid."""
+    try:
+        payload = json.loads(data.decode("utf-8"))
+        command = payload["command"]
+        paths = payload["paths"]
+    except (ValueError, KeyError, TypeError):
+        return None
+    if command not in FORWARDED_COMMANDS or not isinstance(paths, list) or not paths:
+        return None
+    return command, [str(p) for p in paths]
+
+def _exchange(data: bytes) -> bytes:
+    """Send data to the tray daemon and return its reply; raises OSError if none is listening."""
+    name = server_name()
+    if sys.platform == 'win32':
+        with open(rf"\\.\pipe\{name}", 'r+b', buffering=0) as pipe:
+            pipe.write(data)
+            return pipe.read(len(REPLY_OK))
+
+    if os.stat(name).st_uid != os.getuid():
+        raise PermissionError(f"Socket belongs to another user: {name}")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(CONNECT_TIMEOUT)
+        sock.connect(name)
+        sock.settimeout(REPLY_TIMEOUT)
+        sock.sendall(data)
+        return sock.recv(len(REPLY_OK))
+
+def is_daemon_alive() -> bool:
+    """Check whether a tray instance is accepting connections on the local socket."""
+    try:
+        # An empty line is rejected by the server, the connection alone is the answer
+        _exchange(b"\n")
+        return True
+    except OSError:
+        return False
+
+def forward_to_tray(args) -> bool:
+    """
+    Hand a lock/unlock/rekey invocation over to a running tray instance.
+
+    Returns True if the tray accepted the request; the caller can then exit
+    without starting Qt. Returns False when no daemon is listening, in which
+    case the request must be handled in-process.
+    """
+    if len(args) < 2 or args[0] not in FORWARDED_COMMANDS:
+        return False
+    # Options such as --archive and "-" (stdin/stdout) are not part of the protocol
+    if any(arg.startswith("-") for arg in args[1:]):
+        return False
+    try:
+        return _exchange(encode_request(args[0], args[1:])) == REPLY_OK
+    except OSError:
+        return False
@@ -0,0 +1,228 @@
+import time
+import struct
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF as HKDFExpand
+
+# KDF algorithm identifiers stored in the .elock header
+PBKDF2 = 1
+SCRYPT = 2
+ARGON2ID = 3
+HKDF = 4
+
+ALGORITHMS = {"pbkdf2": PBKDF2, "scrypt": SCRYPT, "argon2id": ARGON2ID, "hkdf": HKDF}
+KEY_SIZE = 32
+
+# Raw keys (keyfiles) are already uniformly random and are only expanded
+# with HKDF-SHA256, so they must carry at least a full key's worth of bytes
+MIN_RAW_KEY_SIZE = KEY_SIZE
+HKDF_INFO = b"EasyLock key-encryption key"
+
+# Iterations used by every file written before KDF parameters were stored
+LEGACY_ITERATIONS = 200_000
+
+# Bounds applied to calibration results and to parameters read from files,
+# so a crafted header cannot make unlocking take hours or exhaust memory
+MIN_PBKDF2_ITERATIONS = 100_000
+MAX_PBKDF2_ITERATIONS = 50_000_000
+MIN_SCRYPT_LOG_N = 14
+MAX_SCRYPT_LOG_N = 22
+MAX_MEMORY_KIB = 1024 * 1024
+MIN_ARGON2_MEMORY_KIB = 19 * 1024
+MAX_ARGON2_ITERATIONS = 64
+MAX_LANES = 16
+
+DEFAULT_TARGET_MS = 250
+
+class KdfParams:
+    """
+    Password KDF algorithm and cost parameters, serialized into the header.
+
+    Layout: [ALGORITHM (1)] followed by
+      PBKDF2:   [ITERATIONS (4)]
+      scrypt:   [LOG2 N (1)][R (1)][P (1)]
+      Argon2id: [ITERATIONS (4)][MEMORY KiB (4)][LANES (1)]
+      HKDF:     nothing, it has no cost to tune and only accepts raw keys
+    """
+
+    def __init__(self, algorithm: int, iterations: int = 0, log_n: int = 0, r: int = 8, p: int = 1,
+                 memory_kib: int = 0, lanes: int = 1):
+        self.algorithm = algorithm
+        self.iterations = iterations
+        self.log_n = log_n
+        self.r = r
+        self.p = p
+        self.memory_kib = memory_kib
+        self.lanes = lanes
+        self.validate()
+
+    def validate(self):
+        """Raise ValueError if the parameters are unknown or outside the accepted bounds."""
+        if self.algorithm == PBKDF2:
+            ok = MIN_PBKDF2_ITERATIONS <= self.iterations <= MAX_PBKDF2_ITERATIONS
+        elif self.algorithm == SCRYPT:
+            ok = (MIN_SCRYPT_LOG_N <= self.log_n <= MAX_SCRYPT_LOG_N and 1 <= self.r <= 32
+                  and 1 <= self.p <= MAX_LANES and (128 * self.r << self.log_n) // 1024 <= MAX_MEMORY_KIB)
+        elif self.algorithm == ARGON2ID:
+            ok = (1 <= self.iterations <= MAX_ARGON2_ITERATIONS and 1 <= self.lanes <= MAX_LANES
+                  and max(MIN_ARGON2_MEMORY_KIB, 8 * self.lanes) <= self.memory_kib <= MAX_MEMORY_KIB)
+        elif self.algorithm == HKDF:
+            ok = True
+        else:
+            raise ValueError(f"Unsupported KDF algorithm: {self.algorithm}")
+        if not ok:
+            raise ValueError("KDF parameters are out of range.")
+
+    def pack(self) -> bytes:
+        if self.algorithm == PBKDF2:
+            return struct.pack(">BI", PBKDF2, self.iterations)
+        if self.algorithm == SCRYPT:
+            return struct.pack(">BBBB", SCRYPT, self.log_n, self.r, self.p)
+        if self.algorithm == HKDF:
+            return bytes([HKDF])
+        return struct.pack(">BIIB", ARGON2ID, self.iterations, self.memory_kib, self.lanes)
+
+    @classmethod
+    def unpack(cls, data: bytes) -> "KdfParams":
+        """Parse a serialized parameter block; raises ValueError if it is invalid."""
+        try:
+            if data[:1] == bytes([PBKDF2]):
+                _, iterations = struct.unpack(">BI", data)
+                return cls(PBKDF2, iterations=iterations)
+            if data[:1] == bytes([SCRYPT]):
+                _, log_n, r, p = struct.unpack(">BBBB", data)
+                return cls(SCRYPT, log_n=log_n, r=r, p=p)
+            if data[:1] == bytes([ARGON2ID]):
+                _, iterations, memory_kib, lanes = struct.unpack(">BIIB", data)
+                return cls(ARGON2ID, iterations=iterations, memory_kib=memory_kib, lanes=lanes)
+            if data == bytes([HKDF]):
+                return cls(HKDF)
+        except struct.error:
+            raise ValueError("KDF parameters are malformed.")
+        raise ValueError("Unsupported KDF algorithm.")
+
+    def to_dict(self) -> dict:
+        name = {v: k for k, v in ALGORITHMS.items()}[self.algorithm]
+        if self.algorithm == PBKDF2:
+            return {"algorithm": name, "iterations": self.iterations}
+        if self.algorithm == SCRYPT:
+            return {"algorithm": name, "log_n": self.log_n, "r": self.r, "p": self.p}
+        if self.algorithm == HKDF:
+            return {"algorithm": name}
+        return {"algorithm": name, "iterations": self.iterations, "memory_kib": self.memory_kib,
+                "lanes": self.lanes}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "KdfParams":
+        """Build parameters from a to_dict() mapping, e.g. the cache in config.json."""
+        fields = {k: v for k, v in data.items() if k in ("iterations", "log_n", "r", "p", "memory_kib", "lanes")}
+        return cls(parse_algorithm(data.get("algorithm")), **fields)
+
+    @property
+    def stretched(self) -> bool:
+        """Whether a derivation is deliberately slow; only those are worth caching per batch."""
+        return self.algorithm != HKDF
+
+    def derive(self, password, salt: bytes) -> bytes:
+        """Derive a KEY_SIZE-byte key from salt and a password (str) or raw key (bytes)."""
+        if self.algorithm == HKDF:
+            if not isinstance(password, bytes):
+                raise ValueError("HKDF only accepts raw keys; passwords need a stretching KDF.")
+            check_raw_key(password)
+            return HKDFExpand(algorithm=hashes.SHA256(), length=KEY_SIZE, salt=salt,
+                              info=HKDF_INFO).derive(password)
+        secret = password if isinstance(password, bytes) else password.encode("utf-8")
+        if self.algorithm == PBKDF2:
+            kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), length=KEY_SIZE, salt=salt,
+                             iterations=self.iterations)
+        elif self.algorithm == SCRYPT:
+            kdf = Scrypt(salt=salt, length=KEY_SIZE, n=1 << self.log_n, r=self.r, p=self.p)
+        else:
+            kdf = _argon2id()(salt=salt, length=KEY_SIZE, iterations=self.iterations,
+                              lanes=self.lanes, memory_cost=self.memory_kib)
+        return kdf.derive(secret)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, KdfParams) and self.pack() == other.pack()
+
+    def __hash__(self) -> int:
+        return hash(self.pack())
+
+    def __repr__(self) -> str:
+        return f"KdfParams({self.to_dict()})"
+
+# Parameters of files that carry no KDF field, and of legacy v1 files
+LEGACY = KdfParams(PBKDF2, iterations=LEGACY_ITERATIONS)
+# Parameters of files locked with a raw key
+RAW_KEY = KdfParams(HKDF)
+
+def check_raw_key(key: bytes):
+    """Raise ValueError if key is too short to be used without stretching."""
+    if len(key) < MIN_RAW_KEY_SIZE:
+        raise ValueError(f"Keys must be at least {MIN_RAW_KEY_SIZE} bytes long.")
+
+def load_keyfile(path: str) -> bytes:
+    """Read a raw key from a file, used byte for byte (e.g. `head -c 32 /dev/urandom`)."""
+    with open(path, 'rb') as f:
+        key = f.read()
+    check_raw_key(key)
+    return key
+
+def _argon2id():
+    try:
+        from cryptography.hazmat.primitives.kdf.argon2 import Argon2id
+    except ImportError:
+        raise ValueError("Argon2id requires cryptography 44 or newer.")
+    return Argon2id
+
+def parse_algorithm(name: str) -> int:
+    """Map a configuration name ('pbkdf2', 'scrypt', 'argon2id') to its identifier."""
+    try:
+        return ALGORITHMS[(name or "pbkdf2").lower()]
+    except KeyError:
+        raise ValueError(f"Unknown KDF algorithm: {name}")
+
+def _measure(params: KdfParams) -> float:
+    """Best of two derivations, in seconds."""
+    timings = []
+    for _ in range(2):
+        start = time.perf_counter()
+        params.derive("calibration", bytes(16))
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def calibrate(target_ms: int = DEFAULT_TARGET_MS, algorithm: str = "pbkdf2") -> KdfParams:
+    """
+    Pick cost parameters so one derivation takes about target_ms on this machine.
+
+    PBKDF2 and Argon2id time grow linearly with iterations, so a short probe
+    is scaled up. scrypt memory doubles per step of N, so N is raised until
+    the target is reached. Results are clamped to the accepted bounds.
+    """
+    target = target_ms / 1000
+    algorithm = parse_algorithm(algorithm)
+    if algorithm == HKDF:
+        raise ValueError("HKDF is only used for raw keys, not for passwords.")
+
+    if algorithm == PBKDF2:
+        probe = MIN_PBKDF2_ITERATIONS
+        seconds = _measure(KdfParams(PBKDF2, iterations=probe))
+        iterations = int(probe * target / max(seconds, 1e-6)) // 10_000 * 10_000
+        iterations = min(max(iterations, MIN_PBKDF2_ITERATIONS), MAX_PBKDF2_ITERATIONS)
+        return KdfParams(PBKDF2, iterations=iterations)
+
+    if algorithm == SCRYPT:
+        log_n = MIN_SCRYPT_LOG_N
+        while log_n < MAX_SCRYPT_LOG_N and (128 * 8 << (log_n + 1)) // 1024 <= MAX_MEMORY_KIB:
+            # Each step doubles the time; stop before overshooting by more than half
+            if _measure(KdfParams(SCRYPT, log_n=log_n)) * 1.5 > target:
+                break
+            log_n += 1
+        return KdfParams(SCRYPT, log_n=log_n)
+
+    # Argon2id: fixed 64 MiB, RFC 9106 second recommendation, scale passes
+    memory_kib = 64 * 1024
+    seconds = _measure(KdfParams(ARGON2ID, iterations=1, memory_kib=memory_kib))
+    iterations = min(max(round(target / max(seconds, 1e-6)), 1), MAX_ARGON2_ITERATIONS)
+    return KdfParams(ARGON2ID, iterations=iterations, memory_kib=memory_kib)
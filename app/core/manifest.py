@@ -0,0 +1,179 @@
+import os
+import time
+import sqlite3
+from app.core.crypto import EXTENSION
+
+# Results are committed in groups; a crash loses at most this many records,
+# whose files are simply locked again on the next run
+COMMIT_EVERY = 256
+COMMIT_SECONDS = 2.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    dir      TEXT NOT NULL,
+    name     TEXT NOT NULL,
+    size     INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    inode    INTEGER NOT NULL,
+    error    TEXT,
+    updated  REAL NOT NULL,
+    PRIMARY KEY (dir, name)
+) WITHOUT ROWID
+"""
+
+def signature(st) -> tuple:
+    """What identifies an unchanged file: (size, mtime_ns, inode)."""
+    return st.st_size, st.st_mtime_ns, st.st_ino
+
+class Manifest:
+    """
+    Local SQLite record of files already locked, for incremental runs.
+
+    Rows are keyed by directory and name, so a run looks up one directory
+    at a time instead of loading the whole table. `error` is NULL for files
+    locked successfully; failed files are kept with their message and
+    retried on the next run.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(SCHEMA)
+        self._db.commit()
+        self._uncommitted = 0
+        self._last_commit = time.monotonic()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def known(self, directory: str) -> dict:
+        """Return {name: signature} of the files in directory locked successfully."""
+        rows = self._db.execute(
+            "SELECT name, size, mtime_ns, inode FROM files WHERE dir = ? AND error IS NULL",
+            (directory,))
+        return {name: (size, mtime_ns, inode) for name, size, mtime_ns, inode in rows}
+
+    def forget(self, directory: str, names):
+        """Drop rows of files that no longer exist in directory."""
+        self._db.executemany("DELETE FROM files WHERE dir = ? AND name = ?",
+                             [(directory, name) for name in names])
+
+    def record(self, path: str, sig: tuple, error: str = None):
+        """Store the outcome of locking path, as it was when the run scanned it."""
+        directory, name = os.path.split(path)
+        self._db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         (directory, name, *sig, error, time.time()))
+        self._uncommitted += 1
+        if (self._uncommitted >= COMMIT_EVERY
+                or time.monotonic() - self._last_commit >= COMMIT_SECONDS):
+            self.commit()
+
+    def commit(self):
+        self._db.commit()
+        self._uncommitted = 0
+        self._last_commit = time.monotonic()
+
+    def close(self):
+        self.commit()
+        self._db.close()
+
+def _check(manifest: Manifest, directory: str, entries, changed: dict, keep_original: bool) -> tuple:
+    """
+    Sort the file entries of one directory into changed and unchanged.
+
+    A file is unchanged if its signature matches the manifest and its .elock
+    copy is still next to it; everything else is (re)locked. Without
+    keep_original every plaintext file left is locked, since the run is
+    expected to remove it.
+    """
+    names = {entry.name for entry in entries}
+    known = manifest.known(directory)
+    skipped = unchanged = 0
+    for entry in entries:
+        if entry.name.endswith(EXTENSION):
+            skipped += 1
+            continue
+        try:
+            sig = signature(entry.stat(follow_symlinks=False))
+        except OSError:
+            continue
+        if keep_original and known.get(entry.name) == sig and entry.name + EXTENSION in names:
+            unchanged += 1
+        else:
+            changed[entry.path] = sig
+    stale = [name for name in known if name not in names]
+    if stale:
+        manifest.forget(directory, stale)
+    return skipped, unchanged
+
+def scan_changes(manifest: Manifest, paths, keep_original: bool = True):
+    """
+    Walk files and directory trees like batch.collect_files, keeping only
+    files that are new or modified since the manifest last saw them. A run
+    that removes originals (keep_original False) skips none of them.
+
+    Returns ({absolute path: signature}, skipped .elock files, unchanged files);
+    the signature is None for paths that could not be read.
+    Each file costs one stat and each directory one indexed query, so a
+    mostly unchanged tree is checked in a fraction of the time locking takes.
+    """
+    changed = {}
+    skipped = unchanged = 0
+    stack = []
+    singles = []
+    for path in paths:
+        path = os.path.abspath(path)
+        if os.path.isdir(path):
+            stack.append(path)
+        else:
+            singles.append(path)
+
+    known = {}
+    for path in singles:
+        if path.endswith(EXTENSION):
+            skipped += 1
+            continue
+        try:
+            sig = signature(os.stat(path, follow_symlinks=False))
+        except OSError:
+            # Left to the lock job, which reports it as missing
+            changed[path] = None
+            continue
+        directory, name = os.path.split(path)
+        if directory not in known:
+            known[directory] = manifest.known(directory)
+        if (keep_original and known[directory].get(name) == sig
+                and os.path.exists(path + EXTENSION)):
+            unchanged += 1
+        else:
+            changed[path] = sig
+
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                entries = list(it)
+        except OSError:
+            continue
+        files = []
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    files.append(entry)
+            except OSError:
+                continue
+        counts = _check(manifest, directory, files, changed, keep_original)
+        skipped += counts[0]
+        unchanged += counts[1]
+    manifest.commit()
+    return changed, skipped, unchanged
@@ -0,0 +1,154 @@
+import io
+import os
+import struct
+from cryptography.exceptions import InvalidTag
+from app.core.crypto import (Header, KeySession, CryptoError, CorruptedFileError,
+                             MAGIC, TAG_SIZE, chunk_nonce)
+
+class ElockReader(io.RawIOBase):
+    """
+    Seekable, read-only view of the plaintext of a v2 .elock file.
+
+    Every chunk except the last holds exactly chunk_size plaintext bytes, so
+    the chunk covering any offset is found arithmetically and only that chunk
+    is read and authenticated. Uncompressed chunks also have a fixed
+    ciphertext size; for compressed files the record offsets are indexed once
+    by walking the length prefixes, without decrypting anything. The last
+    decrypted chunk is kept for sequential reads.
+    """
+
+    def __init__(self, f, header: Header, data_key: bytes):
+        super().__init__()
+        self._f = f
+        self._aead = header.aead(data_key)
+        self._prefix = header.nonce_prefix
+        self._aad = header.aad
+        self._chunk_size = header.chunk_size
+        self._codec = header.codec()
+        self._data_offset = f.tell()
+
+        body_size = os.fstat(f.fileno()).st_size - self._data_offset
+        if self._codec is None:
+            record_size = self._chunk_size + TAG_SIZE
+            count = max(1, -(-body_size // record_size))
+            self._records = [(self._data_offset + i * record_size, record_size) for i in range(count)]
+        else:
+            self._records = self._index_records(body_size)
+
+        self._pos = 0
+        self._cached_index = None
+        self._cached_chunk = b""
+        # Authenticating the final chunk up front proves the file was not truncated,
+        # so the size derived from it can be trusted.
+        last = len(self._records) - 1
+        self._size = last * self._chunk_size + len(self._chunk(last))
+
+    def _index_records(self, body_size: int):
+        """Collect (offset, length) of every length-prefixed record."""
+        records = []
+        offset = self._data_offset
+        end = self._data_offset + body_size
+        while offset < end:
+            self._f.seek(offset)
+            raw = self._f.read(4)
+            if len(raw) != 4:
+                raise CorruptedFileError("File structure is corrupted or invalid.")
+            (length,) = struct.unpack(">I", raw)
+            records.append((offset + 4, length))
+            offset += 4 + length
+        if not records or offset != end:
+            raise CorruptedFileError("File structure is corrupted or invalid.")
+        return records
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self._size + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        if pos < 0:
+            raise ValueError("Negative seek position.")
+        self._pos = pos
+        return pos
+
+    def _chunk(self, index: int) -> bytes:
+        """Read and authenticate one chunk."""
+        if index == self._cached_index:
+            return self._cached_chunk
+        offset, length = self._records[index]
+        self._f.seek(offset)
+        record = self._f.read(length)
+        final = index == len(self._records) - 1
+        try:
+            chunk = self._aead.decrypt(chunk_nonce(self._prefix, index, final), record, self._aad)
+        except InvalidTag:
+            raise CorruptedFileError("File is corrupted or invalid.")
+        if self._codec is not None:
+            try:
+                chunk = self._codec.unpack(chunk, self._chunk_size)
+            except Exception:
+                raise CorruptedFileError("File is corrupted or invalid.")
+        self._cached_index = index
+        self._cached_chunk = chunk
+        return chunk
+
+    def read(self, size: int = -1) -> bytes:
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+        end = self._size if size is None or size < 0 else min(self._size, self._pos + size)
+        parts = []
+        while self._pos < end:
+            index, offset = divmod(self._pos, self._chunk_size)
+            chunk = self._chunk(index)
+            part = chunk[offset:offset + end - self._pos]
+            parts.append(part)
+            self._pos += len(part)
+        return b"".join(parts)
+
+    def readall(self) -> bytes:
+        return self.read(-1)
+
+    def readinto(self, buffer) -> int:
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self._f.close()
+            self._cached_chunk = b""
+        super().close()
+
+def open_elock(file_path: str, password: str, session: KeySession = None) -> ElockReader:
+    """
+    Open a v2 .elock file for random-access reading of its plaintext.
+
+    Costs one KDF (or a cached KEK from `session`) plus the final chunk; every
+    read afterwards decrypts only the chunks it covers.
+    """
+    f = open(file_path, 'rb')
+    try:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise CryptoError("Random access requires a v2 .elock file.")
+        header = Header.read(f)
+        data_key = header.open_data_key(session or KeySession(password))
+        return ElockReader(f, header, data_key)
+    except Exception:
+        f.close()
+        raise
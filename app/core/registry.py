@@ -19,8 +19,22 @@ def is_context_menu_installed() -> bool:
     """Check if the context menu integration is currently active."""
     if sys.platform == 'win32':
         return _is_installed_windows()
+    elif sys.platform.startswith('linux'):
+        return _is_installed_linux()
     return False
 
+def refresh_context_menu():
+    """
+    Keep the integration current at tray start-up. Windows registers it if
+    missing; on Linux only files the user already installed are rewritten,
+    so removed actions stay removed until `install` is run again.
+    """
+    if sys.platform == 'win32':
+        if not _is_installed_windows():
+            _register_windows()
+    elif sys.platform.startswith('linux'):
+        _refresh_linux()
+
 def _register_windows():
     """Implement Windows registry entries for shell integration."""
     try:
@@ -74,39 +88,149 @@ def _is_installed_windows() -> bool:
     except WindowsError:
         return False
 
-def _register_linux():
-    """Implement Linux .desktop entries for file manager integration."""
-    apps_dir = os.path.expanduser('~/.local/share/applications')
-    os.makedirs(apps_dir, exist_ok=True)
-    
-    exe_path = sys.executable
+# Linux file-manager actions: (command, English label, Turkish label, .elock files only)
+LINUX_ACTIONS = (
+    ("lock", "Lock with EasyLock", "EasyLock ile Kilitle", False),
+    ("unlock", "Unlock with EasyLock", "EasyLock ile Kilidi Aç", True),
+)
+
+def _data_home() -> str:
+    return os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share")
+
+def _linux_command():
+    """Return the command that starts EasyLock, as a list of arguments."""
     if getattr(sys, 'frozen', False):
-        base_cmd = exe_path
-    else:
-        main_py = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "run.py"))
-        base_cmd = f'{exe_path} {main_py}'
-    
-    # Create main app desktop entry
-    desktop_file = os.path.join(apps_dir, 'easylock.desktop')
-    content = f"""[Desktop Entry]
+        return [sys.executable]
+    main_py = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "run.py"))
+    return [sys.executable, main_py]
+
+def _desktop_exec(*args) -> str:
+    """Build an Exec value, quoting arguments as the Desktop Entry specification requires."""
+    parts = []
+    for arg in args:
+        if arg in ("%f", "%F"):
+            parts.append(arg)
+            continue
+        arg = arg.replace("%", "%%")
+        if not any(c in arg for c in " \t\n\"'\\><~|&;$*?#()`"):
+            parts.append(arg)
+            continue
+        quoted = arg.replace("\\", "\\\\")
+        for c in '"`$':
+            quoted = quoted.replace(c, "\\" + c)
+        parts.append('"' + quoted + '"')
+    # Backslashes are escaped once more by the key file format itself
+    return " ".join(parts).replace("\\", "\\\\")
+
+def _linux_files() -> dict:
+    """
+    Return {path: (content, executable)} of every Linux integration file.
+
+    Every action passes the whole selection (%F) to a single invocation,
+    which locks or unlocks it as one batch behind one password prompt.
+    Nautilus no longer reads action files, so it gets scripts instead,
+    shown in its "Scripts" submenu; they receive the selection as arguments.
+    """
+    import shlex
+
+    command = _linux_command()
+    data = _data_home()
+    files = {}
+
+    files[os.path.join(data, "applications", "easylock.desktop")] = (f"""[Desktop Entry]
 Type=Application
 Name=EasyLock
-Exec={base_cmd} %F
+Exec={_desktop_exec(*command, "open", "%F")}
 Icon=easylock
 Comment=Secure Your Files
 Terminal=false
 Categories=Utility;Security;
 MimeType=application/octet-stream;
-"""
-    with open(desktop_file, 'w', encoding='utf-8') as f:
-        f.write(content)
+""", False)
+
+    dolphin = ["[Desktop Entry]", "Type=Service", "ServiceTypes=KonqPopupMenu/Plugin",
+               "MimeType=all/allfiles;inode/directory;", "X-KDE-Submenu=EasyLock",
+               "Actions=" + ";".join(action for action, *_ in LINUX_ACTIONS) + ";"]
+
+    for action, name_en, name_tr, elock_only in LINUX_ACTIONS:
+        exec_line = _desktop_exec(*command, action, "%F")
+
+        files[os.path.join(data, "nemo", "actions", f"easylock-{action}.nemo_action")] = (f"""[Nemo Action]
+Name={name_en}
+Name[tr]={name_tr}
+Comment={name_en}
+Exec={exec_line}
+Icon-Name=easylock
+Selection=notnone
+Extensions={"elock" if elock_only else "any"};
+Quote=double
+""", False)
+
+        # Caja reads FileManager-Actions definitions
+        files[os.path.join(data, "file-manager", "actions", f"easylock-{action}.desktop")] = (f"""[Desktop Entry]
+Type=Action
+Name={name_en}
+Name[tr]={name_tr}
+Tooltip={name_en}
+Icon=easylock
+Profiles=main;
+
+[X-Action-Profile main]
+Name={name_en}
+Exec={exec_line}
+MimeTypes=all/all;
+{"Basenames=*.elock;" if elock_only else "Basenames=*;"}
+SelectionCount=>0
+""", False)
 
-    # For deep integration (Nautilus/Nemo/Caja actions could be added here)
-    # For now, we rely on the application being in the "Open With" menu 
-    # and the system tray for general management.
+        dolphin += ["", f"[Desktop Action {action}]", f"Name={name_en}", f"Name[tr]={name_tr}",
+                    "Icon=easylock", f"Exec={exec_line}"]
+
+        script = f"#!/bin/sh\nexec {shlex.join(command)} {action} \"$@\"\n"
+        files[os.path.join(data, "nautilus", "scripts", name_en)] = (script, True)
+
+    # Plasma 6 reads kio/servicemenus (entries must be executable), Plasma 5 kservices5
+    dolphin = "\n".join(dolphin) + "\n"
+    files[os.path.join(data, "kio", "servicemenus", "easylock.desktop")] = (dolphin, True)
+    files[os.path.join(data, "kservices5", "ServiceMenus", "easylock.desktop")] = (dolphin, False)
+    return files
+
+def _register_linux():
+    """Write the desktop entry and Nemo, Caja, Dolphin and Nautilus actions."""
+    for path, (content, executable) in _linux_files().items():
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        if executable:
+            os.chmod(path, 0o755)
+
+def _refresh_linux():
+    """Rewrite existing integration files that point at another installation."""
+    for path, (content, executable) in _linux_files().items():
+        try:
+            with open(path, encoding='utf-8') as f:
+                if f.read() == content:
+                    continue
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            if executable:
+                os.chmod(path, 0o755)
+        except OSError:
+            continue
 
 def _unregister_linux():
-    """Remove Linux-specific desktop entries."""
-    desktop_file = os.path.expanduser('~/.local/share/applications/easylock.desktop')
-    if os.path.exists(desktop_file):
-        os.remove(desktop_file)
+    """Remove Linux-specific desktop entries and file-manager actions."""
+    for path in _linux_files():
+        if os.path.exists(path):
+            os.remove(path)
+
+def _is_installed_linux() -> bool:
+    """True if every integration file exists and points at the current installation."""
+    for path, (content, _) in _linux_files().items():
+        try:
+            with open(path, encoding='utf-8') as f:
+                if f.read() != content:
+                    return False
+        except OSError:
+            return False
+    return True
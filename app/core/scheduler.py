@@ -0,0 +1,174 @@
+import os
+import sys
+import time
+import platform
+import threading
+import contextlib
+import multiprocessing
+
+# Throughput a capped job may burst before pacing starts, in seconds of the cap
+BURST_SECONDS = 0.25
+# How often a running job looks for changed limits
+REFRESH_SECONDS = 2.0
+MB = 1024 * 1024
+
+# Linux ioprio_set(2); Python has no wrapper, so the syscall is made directly
+IOPRIO_WHO_PROCESS = 1
+IOPRIO_CLASS_SHIFT = 13
+IOPRIO_CLASS_IDLE = 3
+SYS_IOPRIO_SET = {"x86_64": 251, "amd64": 251, "i386": 289, "i686": 289, "aarch64": 30,
+                  "arm64": 30, "riscv64": 30, "armv7l": 314, "ppc64le": 273}
+BACKGROUND_NICE = 19
+
+# Windows SetThreadPriority modes, lowering CPU and I/O priority together
+THREAD_MODE_BACKGROUND_BEGIN = 0x00010000
+THREAD_MODE_BACKGROUND_END = 0x00020000
+
+_local = threading.local()
+
+def _ioprio_set(value: int):
+    number = SYS_IOPRIO_SET.get(platform.machine().lower())
+    if number is None:
+        return
+    import ctypes
+    ctypes.CDLL(None, use_errno=True).syscall(number, IOPRIO_WHO_PROCESS, 0, value)
+
+def set_background(enabled: bool):
+    """
+    Move the calling thread into or out of the background class.
+
+    On Linux that is nice 19 and the idle I/O class, which only get disk
+    time nobody else wants. Both are per thread and inherited by threads
+    and processes started afterwards. On Windows the thread background mode
+    lowers CPU and I/O priority. Unprivileged processes cannot raise their
+    CPU priority again, so leaving the class may only restore I/O priority.
+    """
+    if getattr(_local, "background", False) == enabled:
+        return
+    _local.background = enabled
+    try:
+        if sys.platform == "win32":
+            import ctypes
+            kernel32 = ctypes.windll.kernel32
+            mode = THREAD_MODE_BACKGROUND_BEGIN if enabled else THREAD_MODE_BACKGROUND_END
+            kernel32.SetThreadPriority(kernel32.GetCurrentThread(), mode)
+            return
+        if sys.platform.startswith("linux"):
+            # Class 0 returns to the default, derived from the nice value
+            _ioprio_set(IOPRIO_CLASS_IDLE << IOPRIO_CLASS_SHIFT if enabled else 0)
+        if enabled:
+            _local.nice = os.getpriority(os.PRIO_PROCESS, 0)
+            os.setpriority(os.PRIO_PROCESS, 0, BACKGROUND_NICE)
+        else:
+            os.setpriority(os.PRIO_PROCESS, 0, getattr(_local, "nice", 0))
+    except (OSError, AttributeError):
+        pass
+
+class Scheduler:
+    """
+    Politeness limits for bulk lock/unlock work, adjustable while it runs.
+
+    background: run file jobs in the background class (see set_background)
+    mb_per_s:   cap on the combined throughput of all workers, 0 for none
+    max_files:  cap on files processed at once, 0 for no cap beyond the pool
+
+    Limits live in shared memory, so the worker processes of a batch see
+    changes at once. With `source`, a callable returning the limits as a
+    dict (e.g. app.utils.config.get_scheduler_limits), refresh() applies
+    them whenever they differ from what the source returned last.
+    """
+
+    def __init__(self, background: bool = False, mb_per_s: float = 0, max_files: int = 0,
+                 source=None):
+        self._background = multiprocessing.RawValue('b', bool(background))
+        self._rate = multiprocessing.RawValue('d', float(mb_per_s or 0))
+        self._max_files = multiprocessing.RawValue('i', int(max_files or 0))
+        # Time at which the bytes granted so far have drained at the current rate
+        self._next = multiprocessing.Value('d', 0.0)
+        self._source = source
+        self._seen = source() if source else None
+        self._checked = time.monotonic()
+        self._slots = threading.Condition()
+        self._active = 0
+
+    def __getstate__(self):
+        # Shared values travel to worker processes; the source and the
+        # in-process slot counter stay with the parent
+        state = dict(self.__dict__)
+        del state["_slots"]
+        state["_source"] = state["_seen"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._slots = threading.Condition()
+
+    @property
+    def background(self) -> bool:
+        return bool(self._background.value)
+
+    @property
+    def mb_per_s(self) -> float:
+        return self._rate.value
+
+    @property
+    def max_files(self) -> int:
+        return self._max_files.value
+
+    def update(self, background: bool = None, mb_per_s: float = None, max_files: int = None):
+        """Change limits; None leaves a limit as it is."""
+        if background is not None:
+            self._background.value = bool(background)
+        if mb_per_s is not None:
+            self._rate.value = float(mb_per_s or 0)
+            # Debt built up under the old cap does not carry over
+            self._next.value = 0.0
+        if max_files is not None:
+            self._max_files.value = int(max_files or 0)
+        with self._slots:
+            self._slots.notify_all()
+
+    def refresh(self):
+        """Pick up changed limits from the source, at most every REFRESH_SECONDS."""
+        if self._source is None or time.monotonic() - self._checked < REFRESH_SECONDS:
+            return
+        self._checked = time.monotonic()
+        try:
+            limits = self._source()
+        except Exception:
+            return
+        if limits != self._seen:
+            self._seen = limits
+            self.update(**limits)
+
+    def throttle(self, nbytes: int):
+        """Sleep as long as needed to keep all callers together under the MB/s cap."""
+        rate = self._rate.value * MB
+        if rate <= 0:
+            return
+        with self._next.get_lock():
+            now = time.monotonic()
+            self._next.value = max(self._next.value, now) + nbytes / rate
+            delay = self._next.value - now - BURST_SECONDS
+        if delay > 0:
+            time.sleep(delay)
+
+    @contextlib.contextmanager
+    def job(self):
+        """
+        Run one file on the calling thread: wait while max_files are already
+        being processed, and apply the background class.
+        """
+        with self._slots:
+            while self.max_files and self._active >= self.max_files:
+                self._slots.wait(timeout=REFRESH_SECONDS)
+                self.refresh()
+            self._active += 1
+        try:
+            self.refresh()
+            set_background(self.background)
+            yield
+        finally:
+            with self._slots:
+                self._active -= 1
+                self._slots.notify()
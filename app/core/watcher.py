@@ -0,0 +1,342 @@
+import os
+import sys
+import time
+import queue
+import struct
+import select
+import threading
+import contextlib
+from collections import deque
+from app.core.crypto import encrypt_file, KeySession, OperationCancelled, EXTENSION
+
+# Seconds a file must stay unchanged before it is locked
+DEFAULT_SETTLE_SECONDS = 2.0
+# Interval of the polling backend and of the debounce check
+POLL_INTERVAL = 1.0
+TICK_INTERVAL = 0.5
+
+# Worker threads locking files, and files waiting for them; files beyond the
+# queue limit stay in the watcher's pending set until there is room
+DEFAULT_WORKERS = max(1, min(4, os.cpu_count() or 1))
+DEFAULT_QUEUE_LIMIT = 256
+# Most recent failures kept for display
+MAX_FAILURES_KEPT = 100
+
+# Names written by downloaders and editors before the final rename
+IGNORED_SUFFIXES = (EXTENSION, "~", ".tmp", ".part", ".partial", ".crdownload", ".swp")
+
+# inotify(7) constants
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+EVENT_HEADER = struct.Struct("iIII")
+
+def is_candidate(path: str) -> bool:
+    """Whether a file in a watched folder should be locked."""
+    name = os.path.basename(path)
+    return not name.startswith(".") and not name.endswith(IGNORED_SUFFIXES)
+
+def _scan(folder: str):
+    """Yield (path, stat) of candidate regular files below folder, without following symlinks."""
+    stack = [folder]
+    while stack:
+        try:
+            entries = list(os.scandir(stack.pop()))
+        except OSError:
+            continue
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False) and is_candidate(entry.path):
+                    yield entry.path, entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+
+class _Inotify:
+    """Minimal recursive inotify binding through libc, Linux only."""
+
+    def __init__(self):
+        import ctypes
+        import ctypes.util
+
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._dirs = {}
+
+    def add_tree(self, folder: str):
+        stack = [folder]
+        while stack:
+            path = stack.pop()
+            wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+            if wd >= 0:
+                self._dirs[wd] = path
+            try:
+                stack.extend(e.path for e in os.scandir(path) if e.is_dir(follow_symlinks=False))
+            except OSError:
+                pass
+
+    def read(self, timeout: float):
+        """Return changed file paths, new directories are watched on the way; None on overflow."""
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        data = os.read(self.fd, 64 * 1024)
+        paths, offset = [], 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                return None
+            folder = self._dirs.get(wd)
+            if folder is None or not name:
+                continue
+            path = os.path.join(folder, os.fsdecode(name))
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self.add_tree(path)
+                    # Files may have landed before the watch was in place
+                    paths.extend(p for p, _ in _scan(path))
+            else:
+                paths.append(path)
+        return paths
+
+    def close(self):
+        os.close(self.fd)
+
+class FolderWatcher:
+    """
+    Report files in a set of folders once writes to them have settled.
+
+    Changes come from inotify on Linux and from periodic rescans elsewhere
+    (or when inotify is unavailable). A changed file is held back until its
+    size and mtime have not moved for `settle` seconds, then passed to
+    offer(path). If offer() returns False (the consumer is full), the file
+    stays pending and is offered again later, which bounds the work in flight.
+    """
+
+    def __init__(self, folders, offer, settle: float = DEFAULT_SETTLE_SECONDS,
+                 use_inotify: bool = None):
+        self.folders = [os.path.abspath(f) for f in folders]
+        self.settle = settle
+        self._offer = offer
+        self._use_inotify = sys.platform.startswith("linux") if use_inotify is None else use_inotify
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+
+    @property
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def touch(self, path: str):
+        """Record a change to path, restarting its settle timer."""
+        if not is_candidate(path):
+            return
+        try:
+            st = os.stat(path, follow_symlinks=False)
+        except OSError:
+            return
+        with self._lock:
+            self._pending[path] = (time.monotonic(), st.st_size, st.st_mtime_ns)
+
+    def rescan(self):
+        for folder in self.folders:
+            for path, _ in _scan(folder):
+                self.touch(path)
+
+    def start(self):
+        source, args = self._run_polling, ()
+        if self._use_inotify:
+            try:
+                inotify = _Inotify()
+                # Watch first, then scan, so nothing lands unseen in between
+                for folder in self.folders:
+                    inotify.add_tree(folder)
+                source, args = self._run_inotify, (inotify,)
+            except (OSError, AttributeError):
+                pass
+        self.rescan()
+        for target, target_args in ((source, args), (self._run_debounce, ())):
+            thread = threading.Thread(target=target, args=target_args, daemon=True,
+                                      name="easylock-watch")
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+
+    def _run_inotify(self, inotify: _Inotify):
+        try:
+            while not self._stop.is_set():
+                paths = inotify.read(TICK_INTERVAL)
+                if paths is None:
+                    # Events were dropped, fall back to a full rescan once
+                    self.rescan()
+                    continue
+                for path in paths:
+                    self.touch(path)
+        finally:
+            inotify.close()
+
+    def _run_polling(self):
+        known = {}
+        while not self._stop.wait(POLL_INTERVAL):
+            current = {}
+            for folder in self.folders:
+                for path, st in _scan(folder):
+                    current[path] = (st.st_size, st.st_mtime_ns)
+                    if known.get(path) != current[path]:
+                        self.touch(path)
+            known = current
+
+    def _run_debounce(self):
+        while not self._stop.wait(TICK_INTERVAL):
+            now = time.monotonic()
+            with self._lock:
+                due = [(p, info) for p, info in self._pending.items() if now - info[0] >= self.settle]
+            for path, (changed, size, mtime) in due:
+                try:
+                    st = os.stat(path, follow_symlinks=False)
+                except OSError:
+                    self._forget(path, changed)
+                    continue
+                if (st.st_size, st.st_mtime_ns) != (size, mtime):
+                    # Still being written, start over
+                    self.touch(path)
+                elif self._offer(path):
+                    self._forget(path, changed)
+                else:
+                    break
+
+    def _forget(self, path: str, changed: float):
+        with self._lock:
+            # A newer change arrived meanwhile, keep waiting for that one
+            if self._pending.get(path, (None,))[0] == changed:
+                del self._pending[path]
+
+class AutoLocker:
+    """
+    Lock files dropped into watched folders with a fixed password.
+
+    Settled files go through a bounded queue to a small pool of worker
+    threads, so a burst of thousands of files never runs more than
+    `workers` jobs at once. The KDF runs once, when the locker starts.
+    An optional Scheduler (see app.core.scheduler) lowers the priority of
+    the workers and caps their throughput and concurrency.
+    """
+
+    def __init__(self, folders, password: str, workers: int = DEFAULT_WORKERS,
+                 queue_limit: int = DEFAULT_QUEUE_LIMIT, settle: float = DEFAULT_SETTLE_SECONDS,
+                 kdf_params=None, scheduler=None, **lock_options):
+        self.session = KeySession(password, kdf_params)
+        self.scheduler = scheduler
+        self.lock_options = lock_options
+        self.watcher = FolderWatcher(folders, self._offer, settle)
+        self.locked = 0
+        self.failures = 0
+        self.failed = deque(maxlen=MAX_FAILURES_KEPT)
+        self._workers = workers
+        self._queue = queue.Queue(maxsize=queue_limit)
+        self._queued = set()
+        self._active = 0
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._threads = []
+
+    def _offer(self, path: str) -> bool:
+        if self._stopping.is_set():
+            return False
+        with self._lock:
+            if path in self._queued:
+                return True
+            self._queued.add(path)
+        try:
+            # Blocks the debounce thread briefly while the workers catch up
+            self._queue.put(path, timeout=TICK_INTERVAL)
+        except queue.Full:
+            with self._lock:
+                self._queued.discard(path)
+            return False
+        return True
+
+    @property
+    def depth(self) -> int:
+        """Files waiting to settle, queued or being locked right now."""
+        with self._lock:
+            busy = len(self._queued) + self._active
+        return self.watcher.pending + busy
+
+    def start(self):
+        self.session.kek(self.session.lock_salt)
+        for _ in range(self._workers):
+            thread = threading.Thread(target=self._work, daemon=True, name="easylock-autolock")
+            thread.start()
+            self._threads.append(thread)
+        self.watcher.start()
+
+    def stop(self):
+        """Stop watching; files still queued are left for the next start to find."""
+        self._stopping.set()
+        self.watcher.stop()
+        # Drop queued files so the workers see their sentinel right after the current one
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+        with self._lock:
+            self._queued.clear()
+        for _ in self._threads:
+            try:
+                self._queue.put_nowait(None)
+            except queue.Full:
+                # Workers also check the stop event between files
+                break
+        for thread in self._threads:
+            thread.join(timeout=30)
+        self._threads = []
+
+    def _work(self):
+        while not self._stopping.is_set():
+            try:
+                path = self._queue.get(timeout=TICK_INTERVAL)
+            except queue.Empty:
+                continue
+            if path is None:
+                return
+            with self._lock:
+                self._queued.discard(path)
+                self._active += 1
+            scheduler = self.scheduler
+            try:
+                if os.path.exists(path + EXTENSION):
+                    # Never overwrite an earlier locked copy of the same name
+                    raise FileExistsError(f"Locked file already exists: {path + EXTENSION}")
+                with scheduler.job() if scheduler else contextlib.nullcontext():
+                    # Stopping abandons the file in progress; its partial output is removed
+                    encrypt_file(path, None, workers=1, session=self.session, cancel=self._stopping,
+                                 throttle=scheduler.throttle if scheduler else None, **self.lock_options)
+                with self._lock:
+                    self.locked += 1
+            except (FileNotFoundError, OperationCancelled):
+                pass
+            except Exception as e:
+                with self._lock:
+                    self.failures += 1
+                    self.failed.append((path, str(e)))
+            finally:
+                with self._lock:
+                    self._active -= 1
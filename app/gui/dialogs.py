@@ -1,8 +1,10 @@
 from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QLabel, QLineEdit, QPushButton, 
-                             QHBoxLayout, QWidget, QGraphicsDropShadowEffect, QCheckBox)
-from PyQt6.QtCore import Qt, QSize, QPropertyAnimation, QRect
+                             QHBoxLayout, QWidget, QGraphicsDropShadowEffect, QCheckBox,
+                             QProgressBar)
+from PyQt6.QtCore import Qt, QSize, QPropertyAnimation, QRect, pyqtSignal
 from PyQt6.QtGui import QColor, QFont, QIcon
 import os
+import time
 
 from app.utils.config import detect_language
 
@@ -11,6 +13,8 @@ TEXTS = {
     "TR": {
         "title_lock": "Dosyayı Şifrele",
         "title_unlock": "Şifreyi Çöz",
+        "title_rekey_old": "Mevcut Şifre",
+        "title_rekey_new": "Yeni Şifre",
         "title_preset": "Ön Ayarlı Şifre",
         "title_confirm": "Onay",
         "title_info": "Bilgi",
@@ -24,11 +28,18 @@ TEXTS = {
         "no": "Hayır",
         "cancel": "İptal",
         "placeholder": "********",
-        "empty_password": "Şifre boş olamaz!"
+        "empty_password": "Şifre boş olamaz!",
+        "progress_lock": "Şifreleniyor...",
+        "progress_unlock": "Şifre çözülüyor...",
+        "progress_starting": "Anahtar türetiliyor...",
+        "progress_cancelling": "İptal ediliyor...",
+        "eta": "kalan"
     },
     "EN": {
         "title_lock": "Lock File",
         "title_unlock": "Unlock File",
+        "title_rekey_old": "Current Password",
+        "title_rekey_new": "New Password",
         "title_preset": "Preset Password",
         "title_confirm": "Confirmation",
         "title_info": "Information",
@@ -42,7 +53,12 @@ TEXTS = {
         "no": "No",
         "cancel": "Cancel",
         "placeholder": "********",
-        "empty_password": "Password cannot be empty!"
+        "empty_password": "Password cannot be empty!",
+        "progress_lock": "Encrypting...",
+        "progress_unlock": "Decrypting...",
+        "progress_starting": "Deriving key...",
+        "progress_cancelling": "Cancelling...",
+        "eta": "left"
     }
 }
 
@@ -111,6 +127,19 @@ DIALOG_STYLESHEET = """
     QCheckBox::indicator:hover {
         border-color: #4CAF50;
     }
+    QProgressBar {
+        background-color: #2d2d2d;
+        border: 2px solid #3e3e3e;
+        border-radius: 8px;
+        height: 14px;
+        text-align: center;
+        color: #ffffff;
+        font-size: 12px;
+    }
+    QProgressBar::chunk {
+        background-color: #4CAF50;
+        border-radius: 6px;
+    }
     QPushButton {
         background-color: #4CAF50;
         color: white;
@@ -180,7 +209,7 @@ class PasswordDialog(QDialog):
         inner_layout.setContentsMargins(30, 30, 30, 30)
         inner_layout.setSpacing(7)
         
-        title_text = self.texts["title_lock"] if self.mode == "lock" else self.texts["title_unlock"]
+        title_text = self.texts.get(f"title_{self.mode}", self.texts["title_unlock"])
         self.lbl_title = QLabel(title_text)
         self.lbl_title.setObjectName("Title")
         self.lbl_title.setAlignment(Qt.AlignmentFlag.AlignCenter)
@@ -464,3 +493,99 @@ class InfoDialog(QDialog):
         self.btn_ok.clicked.connect(self.accept)
         self.btn_ok.setDefault(True)
         inner_layout.addWidget(self.btn_ok)
+
+
+def _format_duration(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
+
+
+class ProgressDialog(QDialog):
+    """Progress dialog with throughput, ETA and a cancel action for long operations."""
+    
+    # Minimum delay between two label refreshes, in seconds
+    REFRESH_INTERVAL = 0.25
+    
+    cancel_requested = pyqtSignal()
+    
+    def __init__(self, mode="lock"):
+        super().__init__()
+        self.lang = detect_language()
+        self.texts = TEXTS.get(self.lang, TEXTS["EN"])
+        self.mode = mode
+        self.started = time.monotonic()
+        self.last_refresh = 0.0
+        self.init_ui()
+        
+    def init_ui(self):
+        self.setWindowFlags(Qt.WindowType.FramelessWindowHint | Qt.WindowType.Dialog)
+        self.setAttribute(Qt.WidgetAttribute.WA_TranslucentBackground)
+        self.setStyleSheet(DIALOG_STYLESHEET)
+        self.setFixedWidth(400)
+
+        layout = QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.setLayout(layout)
+        
+        self.main_widget = QWidget()
+        self.main_widget.setObjectName("MainWidget")
+        layout.addWidget(self.main_widget)
+        
+        shadow = QGraphicsDropShadowEffect(self)
+        shadow.setBlurRadius(30)
+        shadow.setXOffset(0)
+        shadow.setYOffset(10)
+        shadow.setColor(QColor(0, 0, 0, 180))
+        self.main_widget.setGraphicsEffect(shadow)
+        
+        inner_layout = QVBoxLayout(self.main_widget)
+        inner_layout.setContentsMargins(30, 30, 30, 30)
+        inner_layout.setSpacing(10)
+        
+        title_text = self.texts["progress_lock"] if self.mode == "lock" else self.texts["progress_unlock"]
+        self.lbl_title = QLabel(title_text)
+        self.lbl_title.setObjectName("Title")
+        self.lbl_title.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        inner_layout.addWidget(self.lbl_title)
+        
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 1000)
+        self.progress_bar.setValue(0)
+        self.progress_bar.setTextVisible(False)
+        inner_layout.addWidget(self.progress_bar)
+        
+        self.lbl_status = QLabel(self.texts["progress_starting"])
+        self.lbl_status.setObjectName("Message")
+        self.lbl_status.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        inner_layout.addWidget(self.lbl_status)
+        
+        self.btn_cancel = QPushButton(self.texts["cancel"])
+        self.btn_cancel.setObjectName("CancelButton")
+        self.btn_cancel.clicked.connect(self.reject)
+        inner_layout.addWidget(self.btn_cancel)
+        
+    def update_progress(self, done, total):
+        """Refresh the bar, throughput and remaining time (rate-limited)."""
+        now = time.monotonic()
+        if now - self.last_refresh < self.REFRESH_INTERVAL and done < total:
+            return
+        self.last_refresh = now
+        
+        self.progress_bar.setValue(int(done * 1000 / total) if total else 1000)
+        elapsed = now - self.started
+        if elapsed <= 0 or done <= 0:
+            return
+        speed = done / elapsed
+        eta = (total - done) / speed
+        self.lbl_status.setText(
+            f"{speed / (1024 * 1024):.1f} MB/s · {_format_duration(eta)} {self.texts['eta']}"
+        )
+        
+    def reject(self):
+        """Request cancellation; the owner closes the dialog once the work has stopped."""
+        self.lbl_status.setText(self.texts["progress_cancelling"])
+        self.btn_cancel.setEnabled(False)
+        self.cancel_requested.emit()
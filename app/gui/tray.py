@@ -1,17 +1,30 @@
 import sys
 import os
-from PyQt6.QtWidgets import QSystemTrayIcon, QMenu, QApplication
-from PyQt6.QtGui import QIcon, QAction
-from app.utils.config import (set_preset_password, is_auto_start_enabled, 
-                              set_auto_start, detect_language, get_resource_path)
+import threading
+from PyQt6.QtWidgets import QSystemTrayIcon, QMenu, QApplication, QFileDialog
+from PyQt6.QtGui import QIcon, QAction, QActionGroup
+from PyQt6.QtCore import QTimer
+from PyQt6.QtNetwork import QLocalServer, QLocalSocket
+from app.core.ipc import server_name, decode_request, is_daemon_alive, REPLY_OK
+from app.utils.config import (set_preset_password, prefetch_preset_password, get_preset_password,
+                              is_auto_start_enabled, set_auto_start, detect_language, get_resource_path,
+                              get_watch_folders, set_watch_folders, get_scheduler_limits,
+                              set_scheduler_limits, new_scheduler)
 from app.gui.dialogs import PresetPasswordDialog, InfoDialog
 
+# How often the auto-lock queue depth is refreshed in the tooltip and menu
+WATCH_STATUS_INTERVAL_MS = 1000
+# Choices offered in the Background Jobs menu, 0 meaning unlimited
+SPEED_LIMITS = (0, 10, 50, 100)
+FILE_LIMITS = (0, 1, 2, 4)
+
 class EasyLockTray(QSystemTrayIcon):
     """System tray application controller for EasyLock."""
     
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, watch_folders=None):
         super().__init__(parent)
         self.lang = detect_language()
+        self.watch_folders = get_watch_folders() if watch_folders is None else list(watch_folders)
         
         # Initialize resources
         icon_path = get_resource_path(os.path.join("resources", "logotwo.png"))
@@ -20,12 +33,17 @@ class EasyLockTray(QSystemTrayIcon):
         self.setToolTip("EasyLock")
         
         self.init_menu()
+        self.init_server()
+        
+        # Warm the keyring now so quick-lock requests never wait on it
+        prefetch_preset_password()
+        self.init_watcher()
         
-        # Ensure context menu is installed on Windows systems
-        if sys.platform == 'win32':
-            from app.core.registry import is_context_menu_installed, register_context_menu
-            if not is_context_menu_installed():
-                register_context_menu()
+        # Install the context menu on Windows; on Linux only refresh actions the
+        # user installed, so `uninstall` or removing them by hand sticks
+        if sys.platform == 'win32' or sys.platform.startswith('linux'):
+            from app.core.registry import refresh_context_menu
+            refresh_context_menu()
             
         self.show()
 
@@ -38,6 +56,32 @@ class EasyLockTray(QSystemTrayIcon):
         self.act_preset.triggered.connect(self.change_preset_password)
         menu.addAction(self.act_preset)
         
+        # A machine-generated keyfile in place of the preset password
+        self.act_preset_key = QAction("Use Keyfile as Preset..." if self.lang == "EN" else "Anahtar Dosyasını Ön Ayar Yap...", menu)
+        self.act_preset_key.triggered.connect(self.change_preset_key)
+        menu.addAction(self.act_preset_key)
+        
+        # Change the password of existing .elock files
+        self.act_rekey = QAction("Change File Password..." if self.lang == "EN" else "Dosya Şifresini Değiştir...", menu)
+        self.act_rekey.triggered.connect(self.rekey_files)
+        menu.addAction(self.act_rekey)
+        
+        # Folders whose new files are locked automatically
+        watch_menu = menu.addMenu("Watched Folders" if self.lang == "EN" else "İzlenen Klasörler")
+        self.act_watch_status = QAction(watch_menu)
+        self.act_watch_status.setEnabled(False)
+        watch_menu.addAction(self.act_watch_status)
+        watch_menu.addSeparator()
+        act_watch_add = QAction("Add Folder..." if self.lang == "EN" else "Klasör Ekle...", watch_menu)
+        act_watch_add.triggered.connect(self.add_watch_folder)
+        watch_menu.addAction(act_watch_add)
+        act_watch_clear = QAction("Stop Watching All" if self.lang == "EN" else "Tümünü İzlemeyi Bırak", watch_menu)
+        act_watch_clear.triggered.connect(self.clear_watch_folders)
+        watch_menu.addAction(act_watch_clear)
+        
+        # Priority and limits of auto-lock and batch jobs, applied while they run
+        self.init_jobs_menu(menu.addMenu("Background Jobs" if self.lang == "EN" else "Arka Plan İşleri"))
+        
         menu.addSeparator()
         
         # Auto-Start Toggle
@@ -61,6 +105,219 @@ class EasyLockTray(QSystemTrayIcon):
         
         self.setContextMenu(menu)
         
+    def init_jobs_menu(self, jobs_menu):
+        limits = get_scheduler_limits()
+        unlimited = "Unlimited" if self.lang == "EN" else "Sınırsız"
+        
+        act_background = QAction("Low Priority" if self.lang == "EN" else "Düşük Öncelik", jobs_menu)
+        act_background.setCheckable(True)
+        act_background.setChecked(limits["background"])
+        act_background.toggled.connect(lambda checked: self.set_job_limits(background=checked))
+        jobs_menu.addAction(act_background)
+        
+        jobs_menu.addSeparator()
+        speed_group = QActionGroup(jobs_menu)
+        for mb_per_s in SPEED_LIMITS:
+            label = f"{mb_per_s} MB/s" if mb_per_s else f"{unlimited} MB/s"
+            action = QAction(label, speed_group)
+            action.setCheckable(True)
+            action.setChecked(limits["mb_per_s"] == mb_per_s)
+            action.triggered.connect(lambda _, value=mb_per_s: self.set_job_limits(mb_per_s=value))
+            jobs_menu.addAction(action)
+        
+        jobs_menu.addSeparator()
+        files_group = QActionGroup(jobs_menu)
+        for max_files in FILE_LIMITS:
+            if self.lang == "EN":
+                label = f"{max_files or unlimited} file(s) at once"
+            else:
+                label = f"Aynı anda {max_files or unlimited.lower()} dosya"
+            action = QAction(label, files_group)
+            action.setCheckable(True)
+            action.setChecked(limits["max_files"] == max_files)
+            action.triggered.connect(lambda _, value=max_files: self.set_job_limits(max_files=value))
+            jobs_menu.addAction(action)
+
+    def set_job_limits(self, **limits):
+        """Save changed job limits; running batches pick them up from the config."""
+        try:
+            set_scheduler_limits(**limits)
+        except Exception as e:
+            title = "Error" if self.lang == "EN" else "Hata"
+            InfoDialog(title, str(e), "error").exec()
+            return
+        self.scheduler.update(**limits)
+
+    def init_server(self):
+        """Listen for lock/unlock requests forwarded by context-menu invocations."""
+        self.server = QLocalServer(self)
+        self.server.setSocketOptions(QLocalServer.SocketOption.UserAccessOption)
+        self.server.newConnection.connect(self.accept_connections)
+        
+        try:
+            name = server_name()
+        except OSError:
+            # No private socket directory; invocations then run in their own process
+            return
+        if not self.server.listen(name):
+            # A leftover socket from a crashed instance blocks listen(); only
+            # reclaim it when no other tray is answering on it.
+            if not is_daemon_alive():
+                QLocalServer.removeServer(name)
+                self.server.listen(name)
+        
+    def accept_connections(self):
+        while self.server.hasPendingConnections():
+            conn = self.server.nextPendingConnection()
+            conn.readyRead.connect(lambda conn=conn: self.read_request(conn))
+            conn.disconnected.connect(conn.deleteLater)
+            
+    def read_request(self, conn):
+        """Acknowledge a complete request line and handle it once the client is released."""
+        if not conn.canReadLine():
+            return
+        request = decode_request(bytes(conn.readLine()))
+        if request is None:
+            conn.disconnectFromServer()
+            return
+        
+        # A client that gave up waiting handles the request itself; running it
+        # here as well would lock the same files twice
+        connected = QLocalSocket.LocalSocketState.ConnectedState
+        if (conn.state() != connected or conn.write(REPLY_OK) != len(REPLY_OK)
+                or not conn.flush() or conn.state() != connected):
+            conn.abort()
+            return
+        conn.disconnectFromServer()
+        
+        command, paths = request
+        QTimer.singleShot(0, lambda: self.handle_request(command, paths))
+        
+    def handle_request(self, command, paths):
+        from app.main import process_command
+        # An exception escaping a Qt slot would abort the daemon
+        try:
+            process_command(command, paths, self.lang)
+        except Exception as e:
+            title = "Error" if self.lang == "EN" else "Hata"
+            InfoDialog(title, str(e), "error").exec()
+
+    def init_watcher(self):
+        """Auto-lock new files in the watched folders with the preset password."""
+        self.auto_locker = None
+        self.scheduler = new_scheduler()
+        self.watch_pending = False
+        # Bumped on every restart/stop, so a start still in progress knows it is stale
+        self.watch_generation = 0
+        self.reported_failures = 0
+        self.status_timer = QTimer(self)
+        self.status_timer.timeout.connect(self.update_watch_status)
+        self.status_timer.start(WATCH_STATUS_INTERVAL_MS)
+        QApplication.instance().aboutToQuit.connect(self.stop_watcher)
+        self.restart_watcher()
+
+    def stop_watcher(self):
+        self.watch_generation += 1
+        locker, self.auto_locker = self.auto_locker, None
+        if locker is not None:
+            locker.stop()
+
+    def restart_watcher(self):
+        """Apply the current folder list and preset password to the auto-locker."""
+        self.watch_generation += 1
+        locker, self.auto_locker = self.auto_locker, None
+        if locker is not None:
+            # Running jobs finish in the background
+            threading.Thread(target=locker.stop, daemon=True).start()
+        # The locker starts once the keyring lookup has completed, see update_watch_status
+        self.watch_pending = bool(self.watch_folders)
+        self.update_watch_status()
+
+    def start_watcher(self):
+        from app.core.watcher import AutoLocker
+        from app.gui.worker import run_in_background
+        from app.utils.config import get_compression, get_kdf_params, get_cipher
+        
+        try:
+            password = get_preset_password(timeout=0)
+        except Exception:
+            password = None
+        if not password:
+            msg = ("Set a preset password to auto-lock watched folders." if self.lang == "EN"
+                   else "İzlenen klasörleri otomatik kilitlemek için ön ayarlı şifre belirleyin.")
+            self.showMessage("EasyLock", msg, QSystemTrayIcon.MessageIcon.Warning)
+            return
+        
+        # The first call calibrates the KDF and benchmarks the ciphers, which
+        # would freeze the tray; the menu stays live while it runs
+        generation = self.watch_generation
+        try:
+            compress, compress_level, kdf_params, cipher = run_in_background(
+                lambda: (*get_compression(), get_kdf_params(), get_cipher()))
+        except Exception as e:
+            title = "Error" if self.lang == "EN" else "Hata"
+            InfoDialog(title, str(e), "error").exec()
+            return
+        if generation != self.watch_generation:
+            # Folders or password changed meanwhile; the restart starts a new locker
+            return
+        self.auto_locker = AutoLocker(self.watch_folders, password, kdf_params=kdf_params,
+                                      compress=compress, compress_level=compress_level,
+                                      cipher=cipher, scheduler=self.scheduler)
+        self.reported_failures = 0
+        # The initial KDF and folder scan run off the GUI thread
+        threading.Thread(target=self.auto_locker.start, daemon=True).start()
+
+    def update_watch_status(self):
+        """Refresh the queue depth shown in the tooltip and report new failures."""
+        if self.watch_pending and prefetch_preset_password().done():
+            self.watch_pending = False
+            self.start_watcher()
+        
+        locker = self.auto_locker
+        if locker is None:
+            count = len(self.watch_folders)
+            if self.lang == "EN":
+                status = f"Watching {count} folder(s)" if count else "No folders watched"
+            else:
+                status = f"{count} klasör izleniyor" if count else "İzlenen klasör yok"
+            self.act_watch_status.setText(status)
+            self.setToolTip("EasyLock")
+            return
+        
+        depth = locker.depth
+        status = f"Auto-lock: {depth} queued" if self.lang == "EN" else f"Otomatik kilit: {depth} sırada"
+        self.act_watch_status.setText(status)
+        self.setToolTip(f"EasyLock\n{status}")
+        
+        if locker.failures > self.reported_failures:
+            new = locker.failures - self.reported_failures
+            self.reported_failures = locker.failures
+            path, error = locker.failed[-1]
+            msg = (f"{new} file(s) could not be locked. Last: {os.path.basename(path)}: {error}" if self.lang == "EN"
+                   else f"{new} dosya kilitlenemedi. Son: {os.path.basename(path)}: {error}")
+            self.showMessage("EasyLock", msg, QSystemTrayIcon.MessageIcon.Warning)
+
+    def add_watch_folder(self):
+        title = "Select Folder to Auto-Lock" if self.lang == "EN" else "Otomatik Kilitlenecek Klasörü Seçin"
+        folder = QFileDialog.getExistingDirectory(None, title, os.path.expanduser("~"))
+        if folder and folder not in self.watch_folders:
+            self.watch_folders.append(folder)
+            set_watch_folders(self.watch_folders)
+            self.restart_watcher()
+
+    def clear_watch_folders(self):
+        self.watch_folders = []
+        set_watch_folders(self.watch_folders)
+        self.restart_watcher()
+
+    def rekey_files(self):
+        """Pick .elock files and change their password by rewriting only the headers."""
+        title = "Select Encrypted Files" if self.lang == "EN" else "Şifreli Dosyaları Seçin"
+        paths, _ = QFileDialog.getOpenFileNames(None, title, os.path.expanduser("~"), "EasyLock (*.elock)")
+        if paths:
+            self.handle_request("rekey", paths)
+
     def change_preset_password(self):
         """Display configuration dialog for setting a preset password."""
         dialog = PresetPasswordDialog()
@@ -69,6 +326,8 @@ class EasyLockTray(QSystemTrayIcon):
             try:
                 pwd = dialog.password if dialog.password else None
                 set_preset_password(pwd)
+                if self.watch_folders:
+                    self.restart_watcher()
                 
                 msg = "Preset password updated." if self.lang == "EN" else "Ön ayarlı şifre güncellendi."
                 self.showMessage("EasyLock", msg, QSystemTrayIcon.MessageIcon.Information)
@@ -76,6 +335,24 @@ class EasyLockTray(QSystemTrayIcon):
                 title = "Error" if self.lang == "EN" else "Hata"
                 InfoDialog(title, str(e), "error").exec()
 
+    def change_preset_key(self):
+        """Store the bytes of a keyfile as the preset key; locking with it skips the password KDF."""
+        from app.core.kdf import load_keyfile
+        
+        title = "Select Keyfile" if self.lang == "EN" else "Anahtar Dosyasını Seçin"
+        path, _ = QFileDialog.getOpenFileName(None, title, os.path.expanduser("~"))
+        if not path:
+            return
+        try:
+            set_preset_password(load_keyfile(path))
+            if self.watch_folders:
+                self.restart_watcher()
+            msg = "Preset key updated." if self.lang == "EN" else "Ön ayarlı anahtar güncellendi."
+            self.showMessage("EasyLock", msg, QSystemTrayIcon.MessageIcon.Information)
+        except Exception as e:
+            title = "Error" if self.lang == "EN" else "Hata"
+            InfoDialog(title, str(e), "error").exec()
+
     def toggle_autostart(self):
         """Enable or disable system startup integration."""
         state = self.act_autostart.isChecked()
@@ -0,0 +1,79 @@
+import threading
+from PyQt6.QtCore import QThread, QTimer, QEventLoop, pyqtSignal
+from app.gui.dialogs import ProgressDialog
+
+# Jobs finishing faster than this never show the progress dialog
+SHOW_DELAY_MS = 400
+
+class CryptoWorker(QThread):
+    """Run an encrypt/decrypt job off the GUI thread with progress and cancellation."""
+    
+    # Byte counts may exceed 32 bits, so they travel as Python objects
+    progress = pyqtSignal(object, object)
+    
+    def __init__(self, job):
+        super().__init__()
+        self.job = job
+        self.cancel_event = threading.Event()
+        self.result = None
+        self.error = None
+        
+    def run(self):
+        try:
+            self.result = self.job(progress=self.progress.emit, cancel=self.cancel_event)
+        except Exception as e:
+            self.error = e
+            
+    def cancel(self):
+        self.cancel_event.set()
+
+def run_with_progress(mode, job):
+    """
+    Run job(progress=..., cancel=...) on a worker thread while keeping the GUI responsive.
+
+    A ProgressDialog appears if the job takes longer than SHOW_DELAY_MS. The
+    job's return value is returned and its exception, including
+    OperationCancelled, re-raised on the calling thread.
+    """
+    worker = CryptoWorker(job)
+    dialog = ProgressDialog(mode=mode)
+    worker.progress.connect(dialog.update_progress)
+    dialog.cancel_requested.connect(worker.cancel)
+    
+    loop = QEventLoop()
+    worker.finished.connect(loop.quit)
+    
+    def show_dialog():
+        if worker.isRunning():
+            dialog.show()
+            dialog.activateWindow()
+            dialog.raise_()
+    
+    QTimer.singleShot(SHOW_DELAY_MS, show_dialog)
+    worker.start()
+    loop.exec()
+    worker.wait()
+    dialog.close()
+    
+    if worker.error is not None:
+        raise worker.error
+    return worker.result
+
+def run_in_background(job):
+    """
+    Run job() on a worker thread without a progress dialog, for batches.
+
+    The calling (GUI) thread keeps processing events meanwhile, so the tray
+    menu and the request server stay responsive. Returns job's result or
+    re-raises its exception.
+    """
+    worker = CryptoWorker(lambda progress, cancel: job())
+    loop = QEventLoop()
+    worker.finished.connect(loop.quit)
+    worker.start()
+    loop.exec()
+    worker.wait()
+    
+    if worker.error is not None:
+        raise worker.error
+    return worker.result
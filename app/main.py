@@ -1,10 +1,12 @@
 import sys
 import os
-from PyQt6.QtWidgets import QApplication
-from app.core.crypto import encrypt_file, decrypt_file, CryptoError
-from app.gui.dialogs import PasswordDialog, InfoDialog
-from app.gui.tray import EasyLockTray
-from app.utils.config import get_preset_password, detect_language
+from app.utils import trace
+
+# GUI, crypto and keyring modules are imported where they are used, so the
+# headless CLI (--no-gui) and forwarded invocations never pay for Qt start-up.
+
+# Failures listed individually in the batch report dialog
+MAX_LISTED_FAILURES = 10
 
 def is_meta_pressed():
     """Check if Meta (Windows/Command) key is currently pressed."""
@@ -35,6 +37,9 @@ def is_meta_pressed():
 
 def show_message(title, message, dialog_type="info"):
     """Display a custom dark-themed info/error dialog."""
+    from PyQt6.QtWidgets import QApplication
+    from app.gui.dialogs import InfoDialog
+    
     app = QApplication.instance()
     if not app:
         app = QApplication(sys.argv)
@@ -44,12 +49,225 @@ def show_message(title, message, dialog_type="info"):
     dialog.raise_()
     dialog.exec()
 
+def run_single(command, file_path, password, lang):
+    """Lock or unlock a single file in the background and report the outcome in a dialog."""
+    from functools import partial
+    from app.core.crypto import (encrypt_file, decrypt_file, KeySession, CryptoError,
+                                 OperationCancelled, InvalidPasswordError)
+    from app.gui.worker import run_with_progress
+    from app.utils.config import get_compression, get_kdf_params, get_cipher
+    
+    try:
+        if command == "lock":
+            compress, compress_level = get_compression()
+            session = KeySession(password, get_kdf_params())
+            run_with_progress("lock", partial(encrypt_file, file_path, password, session=session,
+                                              compress=compress, compress_level=compress_level,
+                                              cipher=get_cipher()))
+            title = "Success" if lang == "EN" else "Başarılı"
+            msg = "File encrypted successfully." if lang == "EN" else "Dosya başarıyla şifrelendi."
+            show_message(title, msg, "info")
+        else:
+            run_with_progress("unlock", partial(decrypt_file, file_path, password))
+            title = "Success" if lang == "EN" else "Başarılı"
+            msg = "File decrypted successfully." if lang == "EN" else "Dosyanın şifresi başarıyla çözüldü."
+            show_message(title, msg, "info")
+    except OperationCancelled:
+        # Partial output has already been removed by the crypto core
+        pass
+    except CryptoError as e:
+        title = "Encryption Error" if lang == "EN" else "Şifreleme Hatası"
+        err_msg = str(e)
+        if isinstance(e, InvalidPasswordError):
+            err_msg = "Invalid password." if lang == "EN" else "Geçersiz şifre."
+        elif "Invalid password" in err_msg:
+            err_msg = "Invalid password or corrupted file." if lang == "EN" else "Geçersiz şifre veya bozuk dosya."
+        elif "already encrypted" in err_msg:
+            err_msg = "File is already encrypted." if lang == "EN" else "Dosya zaten şifrelenmiş."
+        elif "corrupted" in err_msg:
+            err_msg = "File is corrupted or invalid." if lang == "EN" else "Dosya bozuk veya geçersiz."
+        show_message(title, err_msg, "error")
+    except FileNotFoundError:
+        title = "File Not Found" if lang == "EN" else "Dosya Bulunamadı"
+        msg = "The specified file could not be found." if lang == "EN" else "Belirtilen dosya bulunamadı."
+        show_message(title, msg, "error")
+    except Exception as e:
+        title = "Error" if lang == "EN" else "Hata"
+        msg = f"Unexpected error: {str(e)}"
+        show_message(title, msg, "error")
+
+def run_archive(dir_path, password, lang):
+    """Pack a folder into a single encrypted archive in the background and report the outcome."""
+    from functools import partial
+    from app.core.archive import encrypt_directory, SourceChangedError
+    from app.core.crypto import KeySession, CryptoError, OperationCancelled
+    from app.gui.worker import run_with_progress
+    from app.utils.config import get_compression, get_kdf_params, get_cipher
+    
+    try:
+        compress, compress_level = get_compression()
+        session = KeySession(password, get_kdf_params())
+        run_with_progress("lock", partial(encrypt_directory, dir_path, password, session=session,
+                                          compress=compress, compress_level=compress_level,
+                                          cipher=get_cipher()))
+        title = "Success" if lang == "EN" else "Başarılı"
+        msg = "Folder archived and encrypted successfully." if lang == "EN" else "Klasör arşivlenip başarıyla şifrelendi."
+        show_message(title, msg, "info")
+    except OperationCancelled:
+        pass
+    except FileNotFoundError:
+        title = "Folder Not Found" if lang == "EN" else "Klasör Bulunamadı"
+        msg = "The specified folder could not be found." if lang == "EN" else "Belirtilen klasör bulunamadı."
+        show_message(title, msg, "error")
+    except SourceChangedError as e:
+        title = "Completed with Errors" if lang == "EN" else "Hatalarla Tamamlandı"
+        show_message(title, str(e), "warning")
+    except (CryptoError, OSError) as e:
+        title = "Encryption Error" if lang == "EN" else "Şifreleme Hatası"
+        show_message(title, str(e), "error")
+
+def run_batch_job(command, paths, password, lang):
+    """Lock or unlock files and directory trees, then show one aggregated report."""
+    from app.gui.worker import run_in_background
+    
+    def job():
+        from app.core.batch import run_batch
+        from app.utils.config import get_compression, get_kdf_params, get_cipher, new_scheduler
+        
+        compress, compress_level = get_compression()
+        kdf_params = get_kdf_params() if command == "lock" else None
+        cipher = get_cipher() if command == "lock" else None
+        return run_batch(command, paths, password, compress=compress, compress_level=compress_level,
+                         kdf_params=kdf_params, cipher=cipher, scheduler=new_scheduler())
+    
+    # Calibration and the batch itself run off the GUI thread, so the tray stays usable
+    show_batch_report(command, run_in_background(job), lang)
+
+def run_rekey_job(paths, old_password, new_password, lang):
+    """Change the password of .elock files, then show one aggregated report."""
+    from app.core.batch import run_rekey
+    from app.gui.worker import run_in_background
+    from app.utils.config import get_kdf_params
+    
+    result = run_in_background(lambda: run_rekey(paths, old_password, new_password, get_kdf_params()))
+    show_batch_report("rekey", result, lang)
+
+def show_batch_report(command, result, lang):
+    """Summarize a BatchResult in a single dialog, listing the first failures."""
+    done = len(result.succeeded)
+    if lang == "EN":
+        verb = {"lock": "encrypted", "unlock": "decrypted"}.get(command, "rekeyed")
+        msg = f"{done} file(s) {verb}, {len(result.failed)} failed, {result.skipped} skipped."
+    else:
+        verb = {"lock": "şifrelendi", "unlock": "şifresi çözüldü"}.get(command, "şifresi değiştirildi")
+        msg = f"{done} dosya {verb}, {len(result.failed)} başarısız, {result.skipped} atlandı."
+
+    if not result.failed:
+        title = "Success" if lang == "EN" else "Başarılı"
+        show_message(title, msg, "info")
+        return
+
+    # Keep the dialog readable for large batches
+    lines = [f"{os.path.basename(path)}: {error}" for path, error in result.failed[:MAX_LISTED_FAILURES]]
+    hidden = len(result.failed) - MAX_LISTED_FAILURES
+    if hidden > 0:
+        lines.append(f"... and {hidden} more" if lang == "EN" else f"... ve {hidden} tane daha")
+    title = "Completed with Errors" if lang == "EN" else "Hatalarla Tamamlandı"
+    show_message(title, msg + "\n\n" + "\n".join(lines), "warning")
+
+def ask_password(mode):
+    """Show a PasswordDialog and return the entered password, or None if cancelled."""
+    from app.gui.dialogs import PasswordDialog
+    
+    with trace.span("password_prompt", mode=mode):
+        dialog = PasswordDialog(mode=mode)
+        dialog.activateWindow()
+        dialog.raise_()
+        return dialog.password if dialog.exec() else None
+
+def process_command(command, paths, lang, archive=False, use_preset=None):
+    """
+    Prompt for a password (or use the preset one) and lock/unlock/rekey the given paths.
+
+    With archive=True each folder is locked into a single .elock archive
+    instead of one .elock per file. use_preset=None checks the Meta key now.
+    """
+    from app.utils.config import get_preset_password, PRESET_WAIT_SECONDS
+    
+    if command == "rekey":
+        old_password = ask_password("rekey_old")
+        new_password = old_password and ask_password("rekey_new")
+        if new_password:
+            run_rekey_job(paths, old_password, new_password, lang)
+        return
+    
+    # Check if Meta key is held for quick-lock using preset password
+    if use_preset is None:
+        with trace.span("meta_key"):
+            use_preset = is_meta_pressed()
+    password = None
+    
+    if use_preset:
+        # Prefetched by the tray (or at start-up); a slow keyring falls back to the dialog
+        password = get_preset_password(timeout=PRESET_WAIT_SECONDS)
+        if not password:
+            use_preset = False
+    
+    if not password:
+        password = ask_password("lock" if command == "lock" else "unlock")
+        if not password:
+            return
+    
+    if password:
+        if archive and command == "lock":
+            for path in paths:
+                run_archive(path, password, lang)
+        elif len(paths) == 1 and not os.path.isdir(paths[0]):
+            run_single(command, paths[0], password, lang)
+        else:
+            run_batch_job(command, paths, password, lang)
+
 def main():
-    """Main execution entry point."""
-    app = QApplication(sys.argv)
-    app.setQuitOnLastWindowClosed(False)
+    """Main execution entry point; handles --trace and --profile before dispatching."""
+    args, profile_path = trace.configure(sys.argv[1:])
+    if not profile_path:
+        return _run(args)
+    
+    import cProfile
+    profiler = cProfile.Profile()
+    try:
+        profiler.runcall(_run, args)
+    finally:
+        # Inspect with: python -m pstats easylock.pstats
+        profiler.dump_stats(profile_path)
+
+def _run(args):
+    """Dispatch a command line (without the program name) to the CLI, the tray or a dialog."""
+    from app.core.ipc import resolve_open
+    args = resolve_open(args)
+    
+    # Pipes (a "-" path) have no use for dialogs and always run headless
+    if "--no-gui" in args or "-" in args[1:]:
+        from app.cli import run_cli
+        sys.exit(run_cli(args))
+    
+    # Sample the quick-lock key before Qt start-up so the keyring lookup overlaps it
+    use_preset = None
+    if args and args[0] in ("lock", "unlock"):
+        with trace.span("meta_key"):
+            use_preset = is_meta_pressed()
+        if use_preset:
+            from app.utils.config import prefetch_preset_password
+            prefetch_preset_password()
+    
+    with trace.span("qt_startup"):
+        from PyQt6.QtWidgets import QApplication
+        from app.gui.tray import EasyLockTray
+        from app.utils.config import detect_language
+        
+        app = QApplication(sys.argv)
+        app.setQuitOnLastWindowClosed(False)
     
-    args = sys.argv[1:]
     lang = detect_language()
     
     if not args:
@@ -59,59 +277,10 @@ def main():
         
     command = args[0]
     
-    if command in ["lock", "unlock"] and len(args) > 1:
-        file_path = args[1]
-        
-        # Check if Meta key is held for quick-lock using preset password
-        use_preset = is_meta_pressed()  
-        password = None
-        
-        if use_preset:
-            password = get_preset_password()
-            if not password:
-                use_preset = False
-        
-        if not password:
-            dialog_mode = "lock" if command == "lock" else "unlock"
-            dialog = PasswordDialog(mode=dialog_mode)
-            dialog.activateWindow()
-            dialog.raise_()
-            
-            if dialog.exec():
-                password = dialog.password
-            else:
-                sys.exit(0)
-        
-        if password:
-            try:
-                if command == "lock":
-                    encrypt_file(file_path, password)
-                    title = "Success" if lang == "EN" else "Başarılı"
-                    msg = "File encrypted successfully." if lang == "EN" else "Dosya başarıyla şifrelendi."
-                    show_message(title, msg, "info")
-                else:
-                    decrypt_file(file_path, password)
-                    title = "Success" if lang == "EN" else "Başarılı"
-                    msg = "File decrypted successfully." if lang == "EN" else "Dosyanın şifresi başarıyla çözüldü."
-                    show_message(title, msg, "info")
-            except CryptoError as e:
-                title = "Encryption Error" if lang == "EN" else "Şifreleme Hatası"
-                err_msg = str(e)
-                if "Invalid password" in err_msg:
-                    err_msg = "Invalid password or corrupted file." if lang == "EN" else "Geçersiz şifre veya bozuk dosya."
-                elif "already encrypted" in err_msg:
-                    err_msg = "File is already encrypted." if lang == "EN" else "Dosya zaten şifrelenmiş."
-                elif "corrupted" in err_msg:
-                    err_msg = "File is corrupted or invalid." if lang == "EN" else "Dosya bozuk veya geçersiz."
-                show_message(title, err_msg, "error")
-            except FileNotFoundError:
-                title = "File Not Found" if lang == "EN" else "Dosya Bulunamadı"
-                msg = "The specified file could not be found." if lang == "EN" else "Belirtilen dosya bulunamadı."
-                show_message(title, msg, "error")
-            except Exception as e:
-                title = "Error" if lang == "EN" else "Hata"
-                msg = f"Unexpected error: {str(e)}"
-                show_message(title, msg, "error")
+    if command in ["lock", "unlock", "rekey"] and len(args) > 1:
+        paths = [a for a in args[1:] if a != "--archive"]
+        if paths:
+            process_command(command, paths, lang, archive="--archive" in args, use_preset=use_preset)
 
     elif command == "install":
         from app.core.registry import register_context_menu
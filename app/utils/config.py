@@ -1,7 +1,13 @@
 import os
 import json
 import sys
-import keyring
+import base64
+import copy
+import tempfile
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from functools import lru_cache
+from app.utils import trace
 
 # Path configuration
 if sys.platform == 'win32':
@@ -10,41 +16,271 @@ else:
     CONFIG_DIR = os.path.expanduser('~/.config/EasyLock')
 
 CONFIG_FILE = os.path.join(CONFIG_DIR, 'config.json')
+# Default state of incremental lock runs, see app.core.manifest
+MANIFEST_FILE = os.path.join(CONFIG_DIR, 'manifest.sqlite3')
+
+# Target duration of one password derivation, see get_kdf_params
+DEFAULT_KDF_TARGET_MS = 250
 
 # Keyring identifiers
 KEYRING_SERVICE = "EasyLock"
 KEYRING_PRESET_KEY = "preset_password"
+# Marks a raw key (bytes, from a keyfile) stored in place of the preset password
+RAW_KEY_PREFIX = "easylock-raw-key:"
 
-def get_config() -> dict:
-    """Load the application configuration from the persistent cache."""
-    if not os.path.exists(CONFIG_FILE):
-        return {}
+# Longest a quick-lock waits for a keyring fetch still in flight before
+# falling back to the password dialog
+PRESET_WAIT_SECONDS = 1.0
+
+# Parsed config.json, keyed by the file's (mtime, size, inode) signature
+_config_lock = threading.Lock()
+_config_cache = (None, {})
+
+# Background keyring fetch of the preset password, see prefetch_preset_password
+_preset_lock = threading.Lock()
+_preset_future = None
+
+def _signature():
     try:
-        with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except Exception:
+        st = os.stat(CONFIG_FILE)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+def get_config() -> dict:
+    """
+    Load the application configuration.
+
+    The parsed file is cached in-process and only re-read when its mtime,
+    size or inode changes, so frequent lookups cost a single stat. Callers
+    get their own copy and may modify it before save_config().
+    """
+    global _config_cache
+    signature = _signature()
+    if signature is None:
         return {}
+    with _config_lock:
+        cached_signature, config = _config_cache
+        if cached_signature != signature:
+            try:
+                with trace.span("config_load"), open(CONFIG_FILE, 'r', encoding='utf-8') as f:
+                    config = json.load(f)
+            except Exception:
+                config = {}
+            _config_cache = (signature, config)
+        return copy.deepcopy(config)
 
 def save_config(config: dict):
-    """Persist the configuration dictionary to the local cache file."""
-    if not os.path.exists(CONFIG_DIR):
-        os.makedirs(CONFIG_DIR, exist_ok=True)
-    with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
-        json.dump(config, f, indent=4)
-
-def set_preset_password(password: str):
-    """Securely store the preset password using system-native storage."""
+    """
+    Persist the configuration dictionary atomically.
+
+    The file is written to a temporary sibling, flushed to disk and renamed
+    over config.json, so readers (including other processes) never see a
+    half-written file.
+    """
+    global _config_cache
+    os.makedirs(CONFIG_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=CONFIG_DIR, prefix=".config-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(config, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, CONFIG_FILE)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    with _config_lock:
+        _config_cache = (_signature(), copy.deepcopy(config))
+
+def _keyring():
+    # Imported on first use; the keyring backends are slow to load and the
+    # headless CLI never needs them
+    with trace.span("keyring_import"):
+        import keyring
+        import keyring.errors
+    return keyring
+
+def set_preset_password(password):
+    """
+    Securely store the preset password using system-native storage.
+
+    A raw key (bytes, see app.core.kdf.load_keyfile) may be stored instead;
+    files locked with it skip the password KDF.
+    """
+    global _preset_future
+    keyring = _keyring()
     if password is None:
         try:
             keyring.delete_password(KEYRING_SERVICE, KEYRING_PRESET_KEY)
         except keyring.errors.PasswordDeleteError:
             pass
+    elif isinstance(password, bytes):
+        value = RAW_KEY_PREFIX + base64.b64encode(password).decode("ascii")
+        keyring.set_password(KEYRING_SERVICE, KEYRING_PRESET_KEY, value)
     else:
         keyring.set_password(KEYRING_SERVICE, KEYRING_PRESET_KEY, password)
 
-def get_preset_password() -> str:
-    """Retrieve the preset password from secure system-native storage."""
-    return keyring.get_password(KEYRING_SERVICE, KEYRING_PRESET_KEY)
+    # Keep the in-process copy in step so quick-lock sees the new value at once
+    future = Future()
+    future.set_result(password)
+    with _preset_lock:
+        _preset_future = future
+
+def _fetch_preset_password(future: Future):
+    try:
+        keyring = _keyring()
+        with trace.span("keyring_lookup"):
+            value = keyring.get_password(KEYRING_SERVICE, KEYRING_PRESET_KEY)
+        if value and value.startswith(RAW_KEY_PREFIX):
+            value = base64.b64decode(value[len(RAW_KEY_PREFIX):])
+        future.set_result(value)
+    except Exception as e:
+        future.set_exception(e)
+
+def prefetch_preset_password() -> Future:
+    """
+    Start reading the preset password from the keyring in the background.
+
+    The lookup can be a slow D-Bus round trip or block on an unlock prompt,
+    so it runs on a daemon thread; the tray calls this at start-up. Returns
+    the Future holding the result, shared by every caller of this process.
+    """
+    global _preset_future
+    with _preset_lock:
+        if _preset_future is None:
+            _preset_future = Future()
+            threading.Thread(target=_fetch_preset_password, args=(_preset_future,),
+                             name="easylock-keyring", daemon=True).start()
+        return _preset_future
+
+def get_preset_password(timeout: float = None):
+    """
+    Retrieve the preset password (str) or raw key (bytes) from secure system-native storage.
+
+    Uses the prefetched value when there is one. With a timeout, returns
+    None instead of waiting longer for a lookup that is still running.
+    """
+    global _preset_future
+    future = prefetch_preset_password()
+    try:
+        return future.result(timeout)
+    except FutureTimeout:
+        return None
+    except Exception:
+        # Do not cache failures, e.g. a keyring that was locked at the time
+        with _preset_lock:
+            if _preset_future is future:
+                _preset_future = None
+        raise
+
+def get_compression():
+    """Return the (algorithm, level) used when locking, e.g. ('zlib', 6); algorithm None disables it."""
+    config = get_config()
+    algorithm = config.get("compression")
+    if not algorithm or algorithm == "none":
+        return None, None
+    return algorithm, config.get("compression_level")
+
+def get_kdf_params():
+    """
+    Return the KdfParams used for newly locked files.
+
+    The first call calibrates the KDF ("kdf_algorithm", default pbkdf2) so a
+    derivation takes "kdf_target_ms" on this machine, and caches the result
+    in config.json. Changing either setting triggers a new calibration.
+    """
+    from app.core.kdf import KdfParams, calibrate
+
+    config = get_config()
+    algorithm = config.get("kdf_algorithm", "pbkdf2")
+    target_ms = config.get("kdf_target_ms", DEFAULT_KDF_TARGET_MS)
+    cached = config.get("kdf")
+    if cached and cached.get("algorithm") == algorithm and cached.get("target_ms") == target_ms:
+        try:
+            return KdfParams.from_dict(cached)
+        except (ValueError, TypeError):
+            pass
+
+    with trace.span("kdf_calibration", algorithm=algorithm, target_ms=target_ms):
+        params = calibrate(target_ms, algorithm)
+    config["kdf"] = dict(params.to_dict(), target_ms=target_ms)
+    try:
+        save_config(config)
+    except OSError:
+        # Read-only home directories still work, they just calibrate every run
+        pass
+    return params
+
+def get_cipher() -> str:
+    """
+    Return the payload cipher name used for newly locked files.
+
+    "cipher" in config.json may name one explicitly; with "auto" (the
+    default) both AEADs are benchmarked once and the faster one on this
+    machine is cached as "cipher_benchmark".
+    """
+    import platform
+    from app.core import ciphers
+
+    config = get_config()
+    choice = config.get("cipher", "auto")
+    if choice != "auto":
+        return choice
+
+    machine = f"{platform.machine()} {platform.processor()}".strip()
+    cached = config.get("cipher_benchmark")
+    if cached and cached.get("machine") == machine and cached.get("fastest") in ciphers.CIPHERS:
+        return cached["fastest"]
+
+    with trace.span("cipher_benchmark"):
+        results = ciphers.benchmark()
+    config["cipher_benchmark"] = {"machine": machine, "fastest": ciphers.fastest(results),
+                                  "mb_per_s": results}
+    try:
+        save_config(config)
+    except OSError:
+        pass
+    return config["cipher_benchmark"]["fastest"]
+
+def get_scheduler_limits() -> dict:
+    """
+    Limits for batch and watch-folder jobs, set from the tray menu: background
+    priority, a MB/s cap and a cap on files at once (0 means no cap). Running
+    jobs pick up changes, see app.core.scheduler.Scheduler.
+    """
+    limits = get_config().get("scheduler", {})
+    return {
+        "background": bool(limits.get("background", False)),
+        "mb_per_s": float(limits.get("mb_per_s") or 0),
+        "max_files": int(limits.get("max_files") or 0),
+    }
+
+def set_scheduler_limits(**limits):
+    """Persist some or all of the limits returned by get_scheduler_limits."""
+    config = get_config()
+    config["scheduler"] = {**get_scheduler_limits(), **limits}
+    save_config(config)
+
+def new_scheduler(**overrides):
+    """Scheduler with the configured limits, or overrides, that follows later changes to them."""
+    from app.core.scheduler import Scheduler
+    limits = get_scheduler_limits()
+    limits.update({k: v for k, v in overrides.items() if v is not None})
+    return Scheduler(**limits, source=get_scheduler_limits)
+
+def get_watch_folders():
+    """Return the folders whose new files are locked automatically by the tray."""
+    return [f for f in get_config().get("watch_folders", []) if os.path.isdir(f)]
+
+def set_watch_folders(folders):
+    """Persist the list of auto-lock folders."""
+    config = get_config()
+    config["watch_folders"] = list(folders)
+    save_config(config)
 
 def is_auto_start_enabled() -> bool:
     """Verify if the application is registered for system startup."""
@@ -114,6 +350,7 @@ X-GNOME-Autostart-enabled=true
     except Exception as e:
         print(f"Autostart Error: {e}")
 
+@lru_cache(maxsize=None)
 def detect_language() -> str:
     """Detect the system language and return 'TR' or 'EN'."""
     try:
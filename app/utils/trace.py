@@ -0,0 +1,144 @@
+"""
+Lightweight phase timing.
+
+Enabled with `--trace[=FILE]` or the EASYLOCK_TRACE environment variable
+("1" for stderr, anything else is a file path). Every finished span is
+written as one JSON line with its duration, its fields (such as bytes
+processed) and the time spent in sub-phases like read/aead/write.
+
+When tracing is off, span() returns a shared no-op context manager and
+current() returns None, so instrumented code pays one function call per
+phase and nothing per chunk.
+"""
+import os
+import sys
+import json
+import time
+import threading
+
+TRACE_ENV = "EASYLOCK_TRACE"
+DEFAULT_PROFILE = "easylock.pstats"
+
+_sink = None
+_sink_lock = threading.Lock()
+_local = threading.local()
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **fields):
+        pass
+
+_NULL = _NullSpan()
+
+class Span:
+    """A timed phase; sub-phase totals are collected with timed()."""
+
+    def __init__(self, name: str, fields: dict):
+        self.name = name
+        self.fields = fields
+        self.phases = {}
+        self._lock = threading.Lock()
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+    def add(self, phase: str, seconds: float, nbytes: int = 0):
+        with self._lock:
+            total = self.phases.setdefault(phase, [0.0, 0, 0])
+            total[0] += seconds
+            total[1] += 1
+            total[2] += nbytes
+
+    def timed(self, phase: str, func):
+        """Wrap func so its calls are added to `phase`; bytes results are counted."""
+        def wrapper(*args):
+            start = time.perf_counter()
+            result = func(*args)
+            self.add(phase, time.perf_counter() - start,
+                     len(result) if isinstance(result, (bytes, bytearray)) else 0)
+            return result
+        return wrapper
+
+    def __enter__(self):
+        stack = _local.__dict__.setdefault("stack", [])
+        stack.append(self)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self._start
+        _local.stack.pop()
+        record = {"ts": round(time.time(), 6), "pid": os.getpid(), "span": self.name,
+                  "ms": round(elapsed * 1000, 3)}
+        record.update(self.fields)
+        if self.phases:
+            record["phases"] = {
+                phase: {"ms": round(seconds * 1000, 3), "calls": calls, **({"bytes": nbytes} if nbytes else {})}
+                for phase, (seconds, calls, nbytes) in self.phases.items()
+            }
+        if exc_type is not None:
+            record["error"] = exc_type.__name__
+        _emit(record)
+        return False
+
+def _open_sink(target: str):
+    if not target or target == "0":
+        return None
+    if target == "1":
+        return sys.stderr
+    return open(target, 'a', buffering=1, encoding='utf-8')
+
+def _emit(record: dict):
+    if _sink is None:
+        return
+    line = json.dumps(record, default=str) + "\n"
+    with _sink_lock:
+        _sink.write(line)
+        _sink.flush()
+
+def enable(target: str = "1"):
+    """Start tracing to stderr ("1") or a file; child processes inherit the setting."""
+    global _sink
+    if target not in ("0", "1"):
+        target = os.path.abspath(target)
+    _sink = _open_sink(target)
+    os.environ[TRACE_ENV] = target
+
+def enabled() -> bool:
+    return _sink is not None
+
+def span(name: str, **fields):
+    """Time a phase: `with span("kdf", iterations=n):`. Free when tracing is off."""
+    if _sink is None:
+        return _NULL
+    return Span(name, fields)
+
+def current():
+    """Innermost active span of this thread, or None (always None when tracing is off)."""
+    if _sink is None:
+        return None
+    stack = getattr(_local, "stack", None)
+    return stack[-1] if stack else None
+
+def configure(argv):
+    """
+    Strip --trace[=FILE] and --profile[=FILE] from argv and enable tracing.
+
+    Returns (remaining argv, profile output path or None).
+    """
+    remaining, profile = [], None
+    for arg in argv:
+        if arg == "--trace" or arg.startswith("--trace="):
+            enable(arg.partition("=")[2] or "1")
+        elif arg == "--profile" or arg.startswith("--profile="):
+            profile = arg.partition("=")[2] or DEFAULT_PROFILE
+        else:
+            remaining.append(arg)
+    return remaining, profile
+
+_sink = _open_sink(os.environ.get(TRACE_ENV))
@@ -0,0 +1,346 @@
+"""
+Offline benchmark suite.
+
+Run from the repository root:
+
+    python -m benchmarks.bench --output results.json
+    python -m benchmarks.bench --compare baseline.json
+
+Every case runs in a fresh interpreter so peak RSS and import costs are not
+skewed by earlier cases. Results are written as JSON; with --compare, each
+metric is checked against a stored baseline and the run exits with status 1
+if any of them regressed by more than --threshold.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUN_PY = os.path.join(ROOT, "run.py")
+PASSWORD = "benchmark password"
+
+DEFAULT_SIZES = "1K,1M,16M,256M"
+DEFAULT_BATCH_FILES = 500
+BATCH_FILE_SIZE = 4 * 1024
+DEFAULT_REPEAT = 3
+DEFAULT_THRESHOLD = 0.15
+
+# Direction of every metric, used by the baseline comparison
+LOWER_IS_BETTER = ("seconds", "peak_rss_mb")
+HIGHER_IS_BETTER = ("mb_per_s", "files_per_second")
+
+UNITS = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+def parse_size(text: str) -> int:
+    """Parse sizes such as '1K', '64M' or '4G'."""
+    text = text.strip().upper()
+    if text and text[-1] in UNITS:
+        return int(float(text[:-1]) * UNITS[text[-1]])
+    return int(text)
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MiB, or None where unsupported."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def _write_random(path: str, size: int):
+    block = os.urandom(1024 * 1024)
+    with open(path, 'wb') as f:
+        remaining = size
+        while remaining:
+            n = min(remaining, len(block))
+            f.write(block[:n])
+            remaining -= n
+
+# Cases, each executed in a child interpreter
+
+def pinned_kdfs() -> dict:
+    """
+    Fixed KDF parameters to time. Calibrated parameters always land near their
+    target duration, so only pinned costs can show a regression.
+    """
+    from app.core.kdf import KdfParams, LEGACY, SCRYPT, ARGON2ID
+
+    return {
+        "pbkdf2": LEGACY,
+        "scrypt": KdfParams(SCRYPT, log_n=15, r=8, p=1),
+        "argon2id": KdfParams(ARGON2ID, iterations=3, memory_kib=64 * 1024, lanes=1),
+    }
+
+def case_kdf(repeat: int) -> dict:
+    from app.core.crypto import SALT_SIZE
+
+    salt = os.urandom(SALT_SIZE)
+    results = {}
+    for name, params in pinned_kdfs().items():
+        timings = []
+        try:
+            for _ in range(repeat):
+                start = time.perf_counter()
+                params.derive(PASSWORD, salt)
+                timings.append(time.perf_counter() - start)
+        except ValueError as e:
+            # Argon2id needs a recent cryptography release
+            results[name] = {"skipped": str(e)}
+            continue
+        results[name] = {"seconds": statistics.median(timings), "kdf": params.to_dict()}
+    return results
+
+def case_file(size: int, workdir: str, repeat: int) -> dict:
+    from app.core.crypto import KeySession, encrypt_file, decrypt_file
+
+    path = os.path.join(workdir, "payload.bin")
+    _write_random(path, size)
+    # Derive once up front so the KDF does not dominate small sizes
+    session = KeySession(PASSWORD)
+    session.kek(session.lock_salt)
+
+    lock, unlock = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        locked = encrypt_file(path, PASSWORD, keep_original=True, session=session)
+        lock.append(time.perf_counter() - start)
+        os.remove(path)
+        start = time.perf_counter()
+        decrypt_file(locked, PASSWORD, session=session)
+        unlock.append(time.perf_counter() - start)
+
+    mb = size / (1024 * 1024)
+    results = {}
+    for name, timings in (("encrypt", lock), ("decrypt", unlock)):
+        seconds = statistics.median(timings)
+        results[name] = {"seconds": seconds, "mb_per_s": mb / seconds if seconds else None}
+    results["peak_rss_mb"] = peak_rss_mb()
+    return results
+
+def case_batch(count: int, workdir: str) -> dict:
+    from app.core.batch import run_batch
+
+    tree = os.path.join(workdir, "batch")
+    for i in range(count):
+        sub = os.path.join(tree, f"d{i % 10}")
+        os.makedirs(sub, exist_ok=True)
+        with open(os.path.join(sub, f"f{i}.bin"), 'wb') as f:
+            f.write(os.urandom(BATCH_FILE_SIZE))
+
+    results = {}
+    for command in ("lock", "unlock"):
+        result = run_batch(command, [tree], PASSWORD)
+        if result.failed:
+            raise RuntimeError(f"Batch {command} failed: {result.failed[0]}")
+        results[command] = {"seconds": result.elapsed, "files_per_second": result.files_per_second}
+    results["peak_rss_mb"] = peak_rss_mb()
+    return results
+
+def probe_gui(target: str):
+    """
+    Child side of the GUI start-up case: run run.py like the context menu
+    does and report as soon as the first password dialog is shown.
+    """
+    import runpy
+    from app.gui.dialogs import PasswordDialog
+
+    show_event = PasswordDialog.showEvent
+
+    def shown(self, event):
+        show_event(self, event)
+        sys.stdout.write("shown\n")
+        sys.stdout.flush()
+        os._exit(0)
+
+    PasswordDialog.showEvent = shown
+    sys.argv = [RUN_PY, "lock", target]
+    runpy.run_path(RUN_PY, run_name="__main__")
+    os._exit(1)
+
+def run_case(name: str, args) -> dict:
+    """Entry point of a child interpreter, returns the measured metrics."""
+    workdir = tempfile.mkdtemp(prefix="easylock-bench-", dir=args.tmpdir)
+    try:
+        if name == "kdf":
+            return case_kdf(args.repeat)
+        if name.startswith("file-"):
+            return case_file(parse_size(name[5:]), workdir, args.repeat)
+        if name == "batch":
+            return case_batch(args.batch_files, workdir)
+        raise ValueError(f"Unknown case: {name}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+# Parent side
+
+def _child(case: str, args) -> dict:
+    command = [sys.executable, "-m", "benchmarks.bench", "--case", case,
+               "--repeat", str(args.repeat), "--batch-files", str(args.batch_files)]
+    if args.tmpdir:
+        command += ["--tmpdir", args.tmpdir]
+    out = subprocess.run(command, cwd=ROOT, capture_output=True, text=True)
+    if out.returncode != 0:
+        return {"error": out.stderr.strip().splitlines()[-1] if out.stderr.strip() else "failed"}
+    return json.loads(out.stdout)
+
+def _isolated_env() -> dict:
+    """Environment that keeps start-up cases away from a running tray instance."""
+    env = dict(os.environ)
+    env["XDG_RUNTIME_DIR"] = tempfile.mkdtemp(prefix="easylock-bench-run-")
+    env["EASYLOCK_PASSWORD"] = PASSWORD
+    return env
+
+def bench_startup_cli(repeat: int) -> dict:
+    """Wall time of a headless invocation, dominated by interpreter start and imports."""
+    env = _isolated_env()
+    missing = os.path.join(env["XDG_RUNTIME_DIR"], "missing.txt")
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, RUN_PY, "--no-gui", "lock", missing], cwd=ROOT, env=env,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - start)
+    return {"seconds": statistics.median(timings)}
+
+def bench_startup_gui(repeat: int) -> dict:
+    """Wall time from launching `run.py lock <file>` to the password dialog, offscreen."""
+    try:
+        import PyQt6  # noqa: F401
+    except ImportError:
+        return {"skipped": "PyQt6 is not installed"}
+
+    env = _isolated_env()
+    env["QT_QPA_PLATFORM"] = "offscreen"
+    target = os.path.join(env["XDG_RUNTIME_DIR"], "target.txt")
+    with open(target, 'w') as f:
+        f.write("benchmark")
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = subprocess.run([sys.executable, "-m", "benchmarks.bench", "--probe-gui", target],
+                             cwd=ROOT, env=env, capture_output=True, text=True, timeout=60)
+        if "shown" not in out.stdout:
+            return {"error": out.stderr.strip().splitlines()[-1] if out.stderr.strip() else "no dialog shown"}
+        timings.append(time.perf_counter() - start)
+    return {"seconds": statistics.median(timings)}
+
+def collect(args) -> dict:
+    results = {"kdf": _child("kdf", args)}
+    for size in args.sizes.split(","):
+        results[f"file-{size.strip().upper()}"] = _child(f"file-{size.strip().upper()}", args)
+    results["batch"] = _child("batch", args)
+    results["startup-cli"] = bench_startup_cli(args.repeat)
+    results["startup-gui"] = bench_startup_gui(args.repeat)
+    return results
+
+def _metrics(results: dict, prefix: str = ""):
+    """Flatten nested results into (dotted name, metric, value) triples."""
+    for key, value in results.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            yield from _metrics(value, name)
+        elif isinstance(value, (int, float)) and key in LOWER_IS_BETTER + HIGHER_IS_BETTER:
+            yield name, key, value
+
+def compare(results: dict, baseline: dict, threshold: float):
+    """Return the metrics that got worse than baseline by more than threshold."""
+    old = {name: value for name, _, value in _metrics(baseline.get("results", {}))}
+    regressions = []
+    for name, metric, value in _metrics(results):
+        before = old.get(name)
+        if not before or not value:
+            continue
+        change = value / before - 1
+        worse = change > threshold if metric in LOWER_IS_BETTER else change < -threshold
+        if worse:
+            regressions.append({"metric": name, "baseline": before, "current": value,
+                                "change": round(change, 4)})
+    return regressions
+
+def _isolate_config() -> str:
+    """
+    Point the config directory at a throwaway home for this run and its
+    children, so KDF calibration and the cipher benchmark triggered by the
+    start-up cases never change the user's config.json.
+    """
+    home = tempfile.mkdtemp(prefix="easylock-bench-home-")
+    for name in ("HOME", "USERPROFILE", "APPDATA"):
+        os.environ[name] = home
+    return home
+
+def _metadata() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "kdf": {name: params.to_dict() for name, params in pinned_kdfs().items()},
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench",
+                                     description="Measure EasyLock crypto, KDF and start-up performance.")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES,
+                        help=f"comma separated payload sizes (default: {DEFAULT_SIZES}), e.g. 1K,1M,1G,4G")
+    parser.add_argument("--batch-files", type=int, default=DEFAULT_BATCH_FILES,
+                        help=f"number of small files in the batch case (default: {DEFAULT_BATCH_FILES})")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT,
+                        help=f"runs per case, the median is reported (default: {DEFAULT_REPEAT})")
+    parser.add_argument("--tmpdir", default=None, help="directory for payload files (needs room for 2x the largest size)")
+    parser.add_argument("--output", metavar="FILE", help="write the results to FILE instead of stdout")
+    parser.add_argument("--compare", metavar="BASELINE", help="flag regressions against a stored result file")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help=f"relative change that counts as a regression (default: {DEFAULT_THRESHOLD})")
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    parser.add_argument("--probe-gui", metavar="FILE", help=argparse.SUPPRESS)
+    return parser
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+
+    if args.probe_gui:
+        probe_gui(args.probe_gui)
+    if args.case:
+        json.dump(run_case(args.case, args), sys.stdout)
+        return 0
+
+    home = _isolate_config()
+    try:
+        report = {"meta": _metadata(), "results": collect(args)}
+    finally:
+        shutil.rmtree(home, ignore_errors=True)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        report["baseline"] = baseline.get("meta")
+        report["regressions"] = compare(report["results"], baseline, args.threshold)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    for item in report.get("regressions", []):
+        print(f"REGRESSION {item['metric']}: {item['baseline']:.4g} -> {item['current']:.4g} "
+              f"({item['change']:+.1%})", file=sys.stderr)
+    return 1 if report.get("regressions") else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
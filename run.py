@@ -4,8 +4,18 @@ EasyLock Entry Point
 Automates the application startup and management.
 """
 import sys
-from app.main import main
+import multiprocessing
 
 if __name__ == "__main__":
+    # Required for batch worker processes in frozen (PyInstaller) builds
+    multiprocessing.freeze_support()
+
+    # Let a running tray handle context-menu requests, skipping Qt start-up here
+    if "--no-gui" not in sys.argv:
+        from app.core.ipc import forward_to_tray, resolve_open
+        if forward_to_tray(resolve_open(sys.argv[1:])):
+            sys.exit(0)
+
     # Bootstrap the application
+    from app.main import main
     main()
@@ -0,0 +1,60 @@
+"""
+Cold-start budget of the headless CLI, measured with `python -X importtime`.
+
+The --no-gui path must never load Qt or keyring, and everything a headless
+lock/unlock imports (the CLI, the crypto core, batches, config and the
+scheduler) should stay in the tens of milliseconds.
+"""
+import os
+import re
+import sys
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules imported by `run.py --no-gui lock|unlock ...`
+HEADLESS_MODULES = ("app.cli", "app.core.crypto", "app.core.batch", "app.utils.config",
+                    "app.core.scheduler")
+FORBIDDEN_PREFIXES = ("PyQt6", "keyring")
+# About 60-70 ms here; the best of a few runs is compared to keep noise out
+BUDGET_MS = 100
+RUNS = 3
+
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)")
+
+def _importtime(statement: str) -> list:
+    """Run statement in a fresh interpreter and return [(cumulative us, depth, module)]."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", statement], cwd=ROOT,
+                          capture_output=True, text=True, check=True)
+    entries = []
+    for line in proc.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            entries.append((int(match.group(2)), len(match.group(3)), match.group(4)))
+    return entries
+
+def test_headless_imports_skip_gui_and_keyring():
+    entries = _importtime("import " + ", ".join(HEADLESS_MODULES))
+    loaded = [name for _, _, name in entries if name.startswith(FORBIDDEN_PREFIXES)]
+    assert not loaded, f"headless CLI imports {loaded}"
+
+def test_headless_sys_modules_skip_gui_and_keyring():
+    # Independent of importtime output: inspect sys.modules after the imports
+    statement = ("import sys, " + ", ".join(HEADLESS_MODULES) + "\n"
+                 f"print(','.join(m for m in sys.modules if m.split('.')[0] in {FORBIDDEN_PREFIXES!r}))")
+    proc = subprocess.run([sys.executable, "-c", statement], cwd=ROOT,
+                          capture_output=True, text=True, check=True)
+    assert not proc.stdout.strip(), f"headless CLI imports {proc.stdout.strip()}"
+
+def _headless_total_us() -> int:
+    entries = _importtime("import " + ", ".join(HEADLESS_MODULES))
+    # Top-level entries are the modules named in the statement that were not
+    # already pulled in by an earlier one; their cumulative times cover the rest
+    seen = {name for _, _, name in entries}
+    assert set(HEADLESS_MODULES) <= seen, "importtime output not recognised"
+    return sum(cumulative for cumulative, depth, name in entries
+               if depth == 1 and name in HEADLESS_MODULES)
+
+def test_headless_import_time_budget():
+    total_us = min(_headless_total_us() for _ in range(RUNS))
+    assert total_us / 1000 < BUDGET_MS, f"headless imports took {total_us / 1000:.0f} ms"